@@ -1,4 +1,4 @@
-from Account.models import Account
+from Account.middleware import is_admin
 
 def user_context(request):
     """Add user info to all templates"""
@@ -6,12 +6,8 @@ def user_context(request):
         'is_admin': False,
     }
     
-    user_id = request.session.get('user_id')
-    if user_id:
-        try:
-            account = Account.objects.get(UserID=user_id)
-            context['is_admin'] = account.Role.RoleID == 2 if account.Role else False
-        except Account.DoesNotExist:
-            pass
+    if request.session.get('user_id'):
+        # Uses the account already loaded for this request (one query per request)
+        context['is_admin'] = is_admin(request)
     
     return context
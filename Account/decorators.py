@@ -1,16 +1,37 @@
+from asgiref.sync import iscoroutinefunction
 from django.shortcuts import redirect
 from functools import wraps
-from Account.models import Account
+from Account.models import ADMIN_ROLE_ID
+from Account.middleware import aget_account, aget_role_id, get_account, get_role_id
+
+# Each decorator works on both sync and async views. The async variants
+# await the session and the account lookup, so that by the time the view
+# runs request.account and the session are loaded and safe to use.
 
 def login_required(view_func):
     """
     Decorator that checks if a user is logged in via session.
-    Redirects to login page if not authenticated.
+    Redirects to login page if not authenticated or the account no longer exists.
+    Afterwards the view can rely on request.account.
     """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if not await request.session.ahas_key('user_id'):
+                return redirect('login')
+            if await aget_account(request) is None:
+                await request.session.aflush()
+                return redirect('login')
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if 'user_id' not in request.session:
             return redirect('login')
+        if get_account(request) is None:
+            request.session.flush()
+            return redirect('login')
         return view_func(request, *args, **kwargs)
     return wrapper
 
@@ -19,6 +40,14 @@ def login_prevention(view_func):
     Decorator that prevents logged-in users from accessing login/register pages.
     Redirects to home page if already authenticated.
     """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if await request.session.ahas_key('user_id'):
+                return redirect('home')
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if 'user_id' in request.session:  # Changed: if user IS logged in
@@ -29,23 +58,37 @@ def login_prevention(view_func):
 def admin_required(view_func):
     """
     Decorator that checks if a user is an admin (RoleID = 2).
-    Redirects to home page if not logged in or not an admin.
+    Redirects to home page if not logged in or not an admin, and logs out
+    sessions whose account no longer exists. The role is read from the
+    account loaded once for the request, so a demotion applies at once.
     """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if not await request.session.aget('user_id'):
+                return redirect('login')
+            role_id = await aget_role_id(request)
+            if role_id is None:
+                await request.session.aflush()
+                return redirect('login')
+            if role_id != ADMIN_ROLE_ID:
+                return redirect('home')
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        user_id = request.session.get('user_id')
-        
         # Check if user is logged in
-        if not user_id:
+        if not request.session.get('user_id'):
             return redirect('login')
         
         # Check if user is admin (RoleID = 2)
-        try:
-            account = Account.objects.get(UserID=user_id)
-            if account.Role.RoleID != 2:
-                return redirect('home')
-        except Account.DoesNotExist:
+        role_id = get_role_id(request)
+        if role_id is None:
+            request.session.flush()
             return redirect('login')
+        if role_id != ADMIN_ROLE_ID:
+            return redirect('home')
         
         return view_func(request, *args, **kwargs)
     return wrapper
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Password hashing off the request path, with a cap on how many hashes run at once.
+
+Every make_password / check_password costs a full PBKDF2 run. Instead of
+letting each request worker do that inline, the work goes to a small
+thread pool (hashlib releases the GIL while it hashes, so the threads
+really run in parallel). At most PASSWORD_HASHING_WORKERS hashes run at a
+time, up to PASSWORD_HASHING_QUEUE more wait their turn, and anything
+beyond that - or waiting longer than PASSWORD_HASHING_TIMEOUT seconds - is
+turned away with HashingBusy instead of piling up. A burst of logins then
+uses a bounded share of the CPU and catalog pages keep being served.
+
+Settings (all optional):
+    PASSWORD_HASHING_WORKERS  hashes computed concurrently (default 2)
+    PASSWORD_HASHING_QUEUE    hashes allowed to wait for a worker (default 32)
+    PASSWORD_HASHING_TIMEOUT  seconds a caller waits for its result (default 10)
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 32
+DEFAULT_TIMEOUT = 10
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are queued already"""
+
+    def __init__(self, message='The server is busy, please try again in a moment.'):
+        super().__init__(message)
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_stats = {}
+
+
+def _pool():
+    """The executor and the semaphore bounding running + queued jobs, created on first use"""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_WORKERS)
+            queue = getattr(settings, 'PASSWORD_HASHING_QUEUE', DEFAULT_QUEUE)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+            _slots = threading.BoundedSemaphore(workers + queue)
+        return _executor, _slots
+
+
+def shutdown():
+    """Stop the pool; the next call starts a new one with the current settings"""
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = _slots = None
+
+
+def _record(operation, **values):
+    with _lock:
+        stats = _stats.setdefault(operation, {
+            'calls': 0, 'rejected': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'run_total': 0.0, 'run_max': 0.0,
+        })
+        for name, value in values.items():
+            if name in ('calls', 'rejected'):
+                stats[name] += value
+            else:
+                stats[f'{name}_total'] += value
+                stats[f'{name}_max'] = max(stats[f'{name}_max'], value)
+
+
+def hashing_stats():
+    """
+    Per operation ('hash', 'verify'): calls, rejected, and the total/max
+    seconds spent waiting for a worker and hashing
+    """
+    with _lock:
+        return {operation: dict(stats) for operation, stats in _stats.items()}
+
+
+def reset_hashing_stats():
+    with _lock:
+        _stats.clear()
+
+
+def _run(operation, function, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        _record(operation, rejected=1)
+        logger.warning('Password %s rejected: hashing queue is full', operation)
+        raise HashingBusy()
+
+    submitted = time.perf_counter()
+    timings = {}
+
+    def job():
+        started = time.perf_counter()
+        timings['wait'] = started - submitted
+        try:
+            return function(*args)
+        finally:
+            timings['run'] = time.perf_counter() - started
+
+    try:
+        future = executor.submit(job)
+    except RuntimeError:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        result = future.result(timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', DEFAULT_TIMEOUT))
+    except TimeoutError:
+        # Still queued: drop it. Already running: let it finish, nobody reads the result.
+        future.cancel()
+        _record(operation, rejected=1)
+        logger.warning('Password %s rejected: no result within the timeout', operation)
+        raise HashingBusy()
+
+    _record(operation, calls=1, **timings)
+    logger.debug('Password %s: waited %.1f ms, hashed in %.1f ms',
+                 operation, timings['wait'] * 1000, timings['run'] * 1000)
+    return result
+
+
+def hash_password(password):
+    """make_password() on the hashing pool"""
+    return _run('hash', make_password, password)
+
+
+def _verify(password, encoded):
+    upgraded = []
+    # Django calls the setter when the hash uses an outdated hasher or
+    # work factor; the new hash is computed here, on the pool, too
+    valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+def verify_password(password, encoded):
+    """
+    check_password() on the hashing pool. Returns (valid, new_hash): when the
+    password is right but `encoded` was made with an outdated hasher or
+    iteration count, new_hash is the password hashed with the current
+    settings and should be stored in place of the old one.
+    """
+    return _run('verify', _verify, password, encoded)
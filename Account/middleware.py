@@ -0,0 +1,74 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+from Account.models import Account, ADMIN_ROLE_ID
+
+
+def get_account(request):
+    """
+    Return the logged-in Account (with its Role) or None.
+    Loaded with a single query the first time it is needed and reused for the rest of the request.
+    """
+    if not hasattr(request, '_cached_account'):
+        user_id = request.session.get('user_id')
+        account = None
+        if user_id:
+            account = Account.objects.select_related('Role').filter(UserID=user_id).first()
+        request._cached_account = account
+    return request._cached_account
+
+
+async def aget_account(request):
+    """get_account() for async views: the session and the query are awaited"""
+    if not hasattr(request, '_cached_account'):
+        user_id = await request.session.aget('user_id')
+        account = None
+        if user_id:
+            account = await Account.objects.select_related('Role').filter(UserID=user_id).afirst()
+        request._cached_account = account
+    return request._cached_account
+
+
+def get_role_id(request):
+    """
+    RoleID of the logged-in user, or None. Read from the account loaded for
+    this request (get_account), so a role change or deletion applies on the
+    very next request, however it was made.
+    """
+    account = get_account(request)
+    return account.Role_id if account else None
+
+
+async def aget_role_id(request):
+    account = await aget_account(request)
+    return account.Role_id if account else None
+
+
+def is_admin(request):
+    return get_role_id(request) == ADMIN_ROLE_ID
+
+
+async def ais_admin(request):
+    return await aget_role_id(request) == ADMIN_ROLE_ID
+
+
+class AccountMiddleware:
+    """Attach the logged-in account to the request as request.account (loaded lazily)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI the chain stays async instead of hopping to a thread here
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.account = SimpleLazyObject(lambda: get_account(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Async views load it with aget_account() (the decorators do) before using it
+        request.account = SimpleLazyObject(lambda: get_account(request))
+        return await self.get_response(request)
@@ -1,7 +1,11 @@
 from django.db import models, IntegrityError
-from django.contrib.auth.hashers import make_password
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
+from Account.hashing import hash_password
+
+# Role.RoleID values created by create_default_roles
+USER_ROLE_ID = 1
+ADMIN_ROLE_ID = 2
 
 class Role(models.Model):
     RoleID = models.AutoField(primary_key=True)
@@ -52,7 +56,7 @@ def saveData(data):
             LastName=data.get('last_name'),
             Email=data.get('email'),
             Phone=data.get('phone'),
-            Password=make_password(data.get('password')),
+            Password=hash_password(data.get('password')),
             Role_id=1  # Use Role_id when setting FK by ID
         )
         return account, None
@@ -1,3 +1,270 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from Account import hashing, throttling
+from Account.models import Account, ADMIN_ROLE_ID
+from Account.views import ADMIN_ACCESS_CODE
+from Books.models import Author, Book, Genre
+
+
+def log_in(client, account):
+    session = client.session
+    session['user_id'] = account.UserID
+    session.save()
+    # Signed cookie sessions get a new key whenever their data changes
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+def account_queries(queries):
+    return [q['sql'] for q in queries if '"Account_account"' in q['sql'] or '"Account_role"' in q['sql']]
+
+
+class AccountLoadTests(TestCase):
+    def setUp(self):
+        self.account = Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com',
+            Phone='20000000', Password='x'
+        )
+        log_in(self.client, self.account)
+
+    def test_page_loads_account_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(account_queries(queries)), 1)
+
+    def test_admin_check_loads_account_once(self):
+        self.account.Role_id = ADMIN_ROLE_ID
+        self.account.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('manage_genres'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(account_queries(queries)), 1)
+
+    def test_admin_access_applies_right_away(self):
+        self.assertRedirects(self.client.get(reverse('manage_genres')), reverse('home'))
+
+        self.client.post(reverse('admin_access'), {'admin_code': ADMIN_ACCESS_CODE})
+        self.assertEqual(self.client.get(reverse('manage_genres')).status_code, 200)
+
+    def make_admin_with_other_session(self):
+        Account.objects.filter(UserID=self.account.UserID).update(Role_id=ADMIN_ROLE_ID)
+        other = Client()
+        log_in(other, self.account)
+        self.assertEqual(other.get(reverse('manage_genres')).status_code, 200)
+        return other
+
+    def test_demotion_by_queryset_update_applies_to_other_sessions(self):
+        other = self.make_admin_with_other_session()
+        # No save() and no signals, as from a shell or another process
+        Account.objects.filter(UserID=self.account.UserID).update(Role_id=1)
+        self.assertRedirects(other.get(reverse('manage_genres')), reverse('home'))
+
+    def test_deleted_admin_is_logged_out_of_other_sessions(self):
+        other = self.make_admin_with_other_session()
+        Account.objects.filter(UserID=self.account.UserID).delete()
+        for response in (
+            other.post(reverse('bulk_issue_books'), {'reservation_ids': '1'}),
+            other.get(reverse('issue_book', args=[1])),
+        ):
+            self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertNotIn('user_id', other.session)
+
+    def test_deleted_account_is_logged_out(self):
+        Account.objects.filter(UserID=self.account.UserID).delete()
+        self.assertRedirects(self.client.get(reverse('home')), reverse('login'))
+        self.assertNotIn('user_id', self.client.session)
+
+
+def session_queries(queries):
+    return [q['sql'] for q in queries if '"django_session"' in q['sql']]
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.account = Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com',
+            Phone='20000000', Password='x'
+        )
+        log_in(self.client, self.account)
+        self.client.get(reverse('home'))  # first request warms up the caches
+
+    def test_page_views_leave_session_table_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            for name in ('home', 'reservations', 'account'):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        self.assertEqual(session_queries(queries), [])
+
+    def test_settings_notices_travel_as_messages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('delete_account'), {'password': 'wrong', 'confirmation': 'DELETE'})
+        self.assertRedirects(response, reverse('account'), fetch_redirect_response=False)
+        self.assertEqual(session_queries(queries), [])
+
+        response = self.client.get(reverse('account'))
+        self.assertEqual(response.context['errors'], {'password': 'Incorrect password.'})
+        self.assertEqual(response.context['active_tab'], 'delete')
+        # Shown once
+        self.assertIsNone(self.client.get(reverse('account')).context['errors'])
+
+        self.client.post(reverse('admin_access'), {'admin_code': ADMIN_ACCESS_CODE})
+        response = self.client.get(reverse('account'))
+        self.assertEqual(response.context['success'], 'Admin access granted!')
+        self.assertEqual(response.context['active_tab'], 'profile')
+
+    def test_settings_page_leaves_other_messages_queued(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        book = Book.objects.create(Title='No Copies', ISBN='9780000000001', Author=author, Genre=genre)
+        # Nothing to reserve: the catalog queues an error for the home page
+        self.client.post(reverse('reserve_book', args=[book.BookID]))
+
+        response = self.client.get(reverse('account'))
+        self.assertIsNone(response.context['success'])
+        self.assertIsNone(response.context['errors'])
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(
+            [message.message for message in response.context['messages']],
+            ['This book is not available for reservation.']
+        )
+
+
+class AsyncViewTests(TestCase):
+    """The read-heavy pages are async views; run them through the ASGI handler"""
+
+    def setUp(self):
+        self.account = Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com',
+            Phone='20000000', Password='x'
+        )
+        log_in(self.client, self.account)
+        self.async_client.cookies = self.client.cookies
+
+    async def test_async_decorators(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['is_admin'])
+        self.assertEqual((await self.async_client.get(reverse('account'))).status_code, 200)
+        self.assertEqual((await self.async_client.get(reverse('reservations'))).status_code, 200)
+        # Not an admin
+        self.assertRedirects(
+            await self.async_client.get(reverse('overdue')), reverse('home'), fetch_redirect_response=False
+        )
+
+        self.async_client.cookies.clear()
+        self.assertRedirects(
+            await self.async_client.get(reverse('home')), reverse('login'), fetch_redirect_response=False
+        )
+
+
+class FastPBKDF2Hasher(PBKDF2PasswordHasher):
+    iterations = 1000
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'Account.tests.FastPBKDF2Hasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()  # login throttling buckets
+        hashing.shutdown()
+        hashing.reset_hashing_stats()
+        self.addCleanup(hashing.shutdown)
+        self.account = Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com',
+            Phone='20000000', Password=make_password('secret', hasher='md5')
+        )
+
+    def log_in(self, password='secret'):
+        return self.client.post(reverse('login'), {'email': 'user@example.com', 'password': password})
+
+    def test_login_upgrades_outdated_hash(self):
+        self.assertEqual(self.log_in('wrong').status_code, 200)
+        self.account.refresh_from_db()
+        self.assertTrue(self.account.Password.startswith('md5$'))
+
+        self.assertRedirects(self.log_in(), reverse('home'))
+        self.account.refresh_from_db()
+        self.assertTrue(self.account.Password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(hashing.verify_password('secret', self.account.Password), (True, None))
+        self.assertEqual(hashing.hashing_stats()['verify']['calls'], 3)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0)
+    def test_full_pool_turns_logins_away(self):
+        running, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def hold_worker():
+            running.set()
+            release.wait()
+
+        # Occupy the only worker
+        blocker = threading.Thread(target=hashing._run, args=('verify', hold_worker))
+        blocker.start()
+        self.assertTrue(running.wait(5))
+
+        with self.assertLogs('Account.hashing', 'WARNING'):
+            response = self.log_in()
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'busy', status_code=503)
+        self.assertNotIn('user_id', self.client.session)
+        self.assertEqual(hashing.hashing_stats()['verify']['rejected'], 1)
+
+        release.set()
+        blocker.join()
+        self.assertRedirects(self.log_in(), reverse('home'))
+
+
+@override_settings(THROTTLE_RATES={'login-ip': '4/min', 'login-account': '2/min', 'admin-access-account': '1/min'})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def log_in(self, email):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'secret'})
+
+    def test_login_is_limited_per_account_and_per_ip(self):
+        self.assertEqual(self.log_in('a@example.com').status_code, 200)
+        self.assertEqual(self.log_in('A@example.com ').status_code, 200)
+
+        # Turned away before the account lookup and the hash
+        with CaptureQueriesContext(connection) as queries:
+            response = self.log_in('a@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, 'Too many attempts', status_code=429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        # Other accounts still get through until the IP runs out
+        self.assertEqual(self.log_in('b@example.com').status_code, 200)
+        self.assertEqual(self.log_in('c@example.com').status_code, 429)
+        self.assertEqual(throttling.throttle_stats()['login-ip'], 1)
+        self.assertEqual(throttling.throttle_stats()['login-account'], 1)
+
+    def test_admin_access_is_limited_per_account(self):
+        account = Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com', Phone='20000000', Password='x'
+        )
+        log_in(self.client, account)
+
+        self.assertRedirects(self.client.post(reverse('admin_access'), {'admin_code': 'guess'}), reverse('account'))
+        response = self.client.post(reverse('admin_access'), {'admin_code': ADMIN_ACCESS_CODE})
+        self.assertEqual(response.status_code, 429)
+        account.refresh_from_db()
+        self.assertNotEqual(account.Role_id, ADMIN_ROLE_ID)
+
+    def test_bucket_refills_over_time(self):
+        self.assertEqual(throttling.take_token('login-account', 'x', now=1000), 0)
+        self.assertEqual(throttling.take_token('login-account', 'x', now=1000), 0)
+        self.assertAlmostEqual(throttling.take_token('login-account', 'x', now=1000), 30)
+        # Two per minute: one token back after 30 seconds
+        self.assertEqual(throttling.take_token('login-account', 'x', now=1030), 0)
@@ -0,0 +1,143 @@
+"""
+Token-bucket rate limiting for the login and admin code endpoints.
+
+Each (scope, key) pair - e.g. ('login-ip', '10.0.0.7') - has a bucket of
+`capacity` tokens that refills at `capacity / period` tokens per second.
+An attempt takes a token; with the bucket empty the request gets a 429
+straight away, before the view touches the database or hashes anything.
+
+Buckets live in the cache named by THROTTLE_CACHE (default: 'default', a
+local-memory cache here; point it at a shared backend when running several
+processes). Rates come from THROTTLE_RATES, e.g. {'login-ip': '30/min'}.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.shortcuts import render
+
+DEFAULT_RATES = {
+    'login-ip': '30/min',
+    'login-account': '5/min',
+    'admin-access-ip': '10/min',
+    'admin-access-account': '5/min',
+}
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+# Buckets are read and written back, so updates within a process are serialised
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+
+def parse_rate(rate):
+    """'5/min' -> (capacity 5, period 60 seconds)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def get_rate(scope):
+    rates = {**DEFAULT_RATES, **getattr(settings, 'THROTTLE_RATES', {})}
+    rate = rates.get(scope)
+    return parse_rate(rate) if rate else None
+
+
+def take_token(scope, key, now=None):
+    """
+    Take a token from the bucket of (scope, key). Returns 0 when allowed,
+    otherwise the seconds until a token is available again.
+    """
+    rate = get_rate(scope)
+    if rate is None:
+        return 0
+    capacity, period = rate
+    refill = capacity / period
+    now = time.time() if now is None else now
+    cache = _cache()
+    # Keys can hold emails; hash them to something any backend accepts
+    bucket_key = f'throttle:{scope}:{hashlib.sha256(key.encode()).hexdigest()[:32]}'
+
+    with _lock:
+        tokens, updated = cache.get(bucket_key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill
+        if not wait:
+            tokens -= 1
+        # A bucket left alone for a full period is full again, so it can expire
+        cache.set(bucket_key, (tokens, now), timeout=period + 1)
+    return wait
+
+
+def _count_throttled(scope):
+    cache = _cache()
+    key = f'throttled:{scope}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def throttle_stats():
+    """How many requests each scope has turned away (since the cache was last cleared)"""
+    scopes = {**DEFAULT_RATES, **getattr(settings, 'THROTTLE_RATES', {})}
+    counts = _cache().get_many([f'throttled:{scope}' for scope in scopes])
+    return {scope: counts.get(f'throttled:{scope}', 0) for scope in scopes}
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def posted_email(request):
+    email = request.POST.get('email', '').strip().lower()
+    return email or None
+
+
+def session_user(request):
+    user_id = request.session.get('user_id')
+    return str(user_id) if user_id else None
+
+
+def throttle(*rules, template=None):
+    """
+    Rate limit the POSTs to a view. `rules` are (scope, key function) pairs
+    checked in order; a key function returning None skips its rule. With a
+    `template` the 429 renders it with the error, like a failed form.
+
+        @throttle(('login-ip', client_ip), ('login-account', posted_email), template='login.html')
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST':
+                for scope, key_func in rules:
+                    key = key_func(request)
+                    if key is None:
+                        continue
+                    wait = take_token(scope, key)
+                    if wait:
+                        _count_throttled(scope)
+                        return _throttled_response(request, wait, template)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _throttled_response(request, wait, template):
+    retry_after = max(1, round(wait))
+    message = f'Too many attempts. Please try again in {retry_after} seconds.'
+    if template:
+        response = render(request, template, {
+            'errors': {'general': message},
+            'data': {'email': request.POST.get('email', '')},
+        }, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
@@ -1,8 +1,12 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.contrib.auth.hashers import check_password, make_password
+from django.contrib import messages
 from django.db import IntegrityError
+from Account.hashing import HashingBusy, hash_password, verify_password
 from Account.models import Account, registerAccount, Role
 from Account.decorators import login_prevention, login_required
+from Account.middleware import aget_account
+from Account.throttling import throttle, client_ip, posted_email, session_user
 
 # Secret admin code // This would normally be in enviroment variables.
 ADMIN_ACCESS_CODE = "SKOLA2026" 
@@ -27,9 +31,13 @@ def register(request):
     return render(request, 'register.html', context)
 
 
+# Throttled first: a flood of attempts is turned away before the session,
+# the account lookup or the password hash cost anything
+@throttle(('login-ip', client_ip), ('login-account', posted_email), template='login.html')
 @login_prevention
 def login(request):
     context = {}
+    status = 200
 
     if request.method == "POST":
         email = request.POST.get('email')
@@ -37,7 +45,11 @@ def login(request):
         
         try:
             account = Account.objects.get(Email=email)
-            if check_password(password, account.Password):
+            valid, new_hash = verify_password(password, account.Password)
+            if valid:
+                if new_hash:
+                    # Stored with an outdated hasher or work factor - keep the stronger hash
+                    Account.objects.filter(UserID=account.UserID).update(Password=new_hash)
                 request.session['user_id'] = account.UserID
                 request.session['user_name'] = f"{account.FirstName} {account.LastName}"
                 return redirect('home')
@@ -45,10 +57,13 @@ def login(request):
                 context['errors'] = {'general': 'Invalid email or password.'}
         except Account.DoesNotExist:
             context['errors'] = {'general': 'Invalid email or password.'}
+        except HashingBusy as e:
+            context['errors'] = {'general': str(e)}
+            status = 503
         
         context['data'] = {'email': email}
 
-    return render(request, 'login.html', context)
+    return render(request, 'login.html', context, status=status)
 
 
 def logout(request):
@@ -56,38 +71,53 @@ def logout(request):
     return redirect('login')
 
 
+def flash_errors(request, errors, tab):
+    """Carry form errors over a redirect to the settings page, one message per field"""
+    for field, message in errors.items():
+        messages.error(request, message, extra_tags=f'tab:{tab} field:{field}')
+
+
 @login_required
-def account_settings(request):
-    user_id = request.session.get('user_id')
-    
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
+async def account_settings(request):
+    account = await aget_account(request)
     
     context = {
         'account': account,
-        'success': request.session.pop('success_message', None),
-        'active_tab': request.session.pop('active_tab', None),
-        'errors': request.session.pop('delete_errors', None),
+        'success': None,
+        'active_tab': None,
+        'errors': None,
     }
     
-    return render(request, 'settings.html', context)
+    # One-shot values left by the POST handlers. They travel in the messages
+    # cookie, so showing them doesn't write to the session. Only the ones
+    # tagged with a settings tab are for this page; reading the storage
+    # consumes everything, so the rest is queued again for the next page.
+    errors = {}
+    storage = messages.get_messages(request)
+    others = []
+    for message in storage:
+        tags = dict(tag.split(':', 1) for tag in message.extra_tags.split() if ':' in tag)
+        if 'tab' not in tags:
+            others.append(message)
+            continue
+        context['active_tab'] = tags['tab']
+        if message.level == messages.ERROR:
+            errors[tags.get('field', 'general')] = message.message
+        else:
+            context['success'] = message.message
+    for message in others:
+        storage.add(message.level, message.message, extra_tags=message.extra_tags)
+    context['errors'] = errors or None
+    
+    return await sync_to_async(render)(request, 'settings.html', context)
 
 
 @login_required
 def update_account(request):
     """Handle account information updates"""
-    user_id = request.session.get('user_id')
+    account = request.account
     context = {}
     
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
-    
     if request.method == "POST":
         data = request.POST.dict()
         errors = {}
@@ -127,7 +157,7 @@ def update_account(request):
                 
                 # Update session with new name
                 request.session['user_name'] = f"{first_name} {last_name}"
-                request.session['success_message'] = "Account updated successfully!"
+                messages.success(request, "Account updated successfully!", extra_tags='tab:profile')
                 
                 return redirect('account')
                 
@@ -152,15 +182,9 @@ def update_account(request):
 @login_required
 def change_password(request):
     """Handle password changes"""
-    user_id = request.session.get('user_id')
+    account = request.account
     context = {}
     
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
-    
     if request.method == "POST":
         current_password = request.POST.get('current_password', '')
         new_password = request.POST.get('new_password', '')
@@ -171,8 +195,12 @@ def change_password(request):
         # Validate current password
         if not current_password:
             errors['current_password'] = "Current password is required."
-        elif not check_password(current_password, account.Password):
-            errors['current_password'] = "Current password is incorrect."
+        else:
+            try:
+                if not verify_password(current_password, account.Password)[0]:
+                    errors['current_password'] = "Current password is incorrect."
+            except HashingBusy as e:
+                errors['general'] = str(e)
         
         # Validate new password
         if not new_password:
@@ -188,10 +216,13 @@ def change_password(request):
         
         if not errors:
             try:
-                account.Password = make_password(new_password)
+                account.Password = hash_password(new_password)
                 account.save()
-                request.session['success_message'] = "Password changed successfully!"
+                messages.success(request, "Password changed successfully!", extra_tags='tab:password')
                 return redirect('account')
+            except HashingBusy as e:
+                errors['general'] = str(e)
+                context['errors'] = errors
             except Exception as e:
                 errors['general'] = "An error occurred while changing your password."
                 context['errors'] = errors
@@ -204,22 +235,15 @@ def change_password(request):
 @login_required
 def delete_account(request):
     """Handle account deletion"""
-    user_id = request.session.get('user_id')
+    account = request.account
     context = {}
     errors = {}
     
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
-    
     if request.method == "POST":
         # Check for active rentals first (no Return record means still active)
         if account.rentals.filter(return__isnull=True).exists():
             errors['general'] = "You cannot delete your account while you have active rentals. Please return all books first."
-            request.session['delete_errors'] = errors
-            request.session['active_tab'] = 'delete'
+            flash_errors(request, errors, 'delete')
             return redirect('account')
 
         password = request.POST.get('password', '')
@@ -228,8 +252,12 @@ def delete_account(request):
         # Verify password
         if not password:
             errors['password'] = "Password is required to delete your account."
-        elif not check_password(password, account.Password):
-            errors['password'] = "Incorrect password."
+        else:
+            try:
+                if not verify_password(password, account.Password)[0]:
+                    errors['password'] = "Incorrect password."
+            except HashingBusy as e:
+                errors['general'] = str(e)
         
         # Verify confirmation text
         if confirmation.strip().lower() != 'delete':
@@ -245,23 +273,17 @@ def delete_account(request):
         
         # If we still have errors, stash them and redirect back to the delete tab
         if errors:
-            request.session['delete_errors'] = errors
-            request.session['active_tab'] = 'delete'
+            flash_errors(request, errors, 'delete')
             return redirect('account')
     
     return redirect('account')
 
 
+@throttle(('admin-access-ip', client_ip), ('admin-access-account', session_user))
 @login_required
 def admin_access(request):
     """Handle secret admin access code submission"""
-    user_id = request.session.get('user_id')
-    
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
+    account = request.account
     
     if request.method == "POST":
         admin_code = request.POST.get('admin_code', '')
@@ -275,8 +297,7 @@ def admin_access(request):
                 account.save()
                 
                 # Set success message
-                request.session['success_message'] = "Admin access granted!"
-                request.session['active_tab'] = 'profile'
+                messages.success(request, "Admin access granted!", extra_tags='tab:profile')
                 return redirect('account')
             except Role.DoesNotExist:
                 # If Role 2 doesn't exist, silently fail
@@ -0,0 +1,62 @@
+"""
+Running the independent queries of an async view at the same time.
+
+Django's async ORM methods all go through one thread per request, so
+awaiting several of them still runs the queries back to back. gather_queries()
+instead runs each (synchronous) function in a worker thread of its own, with
+its own database connection, and waits for all of them together.
+"""
+import asyncio
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+
+# execute_wrapper()s to install on the worker connections as well
+_worker_wrappers = []
+
+
+@contextmanager
+def worker_execute_wrapper(wrapper):
+    """
+    connection.execute_wrapper(wrapper), but for the connections of the
+    gather_queries() workers started while the block runs. Lets tools such as
+    benchmark_views see the queries that don't run on the request's connection.
+    """
+    _worker_wrappers.append(wrapper)
+    try:
+        yield
+    finally:
+        _worker_wrappers.remove(wrapper)
+
+
+def _in_worker(function):
+    def run():
+        try:
+            with ExitStack() as stack:
+                for wrapper in list(_worker_wrappers):
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+                return function()
+        finally:
+            # Always close, whatever CONN_MAX_AGE says: nothing on these
+            # executor threads ever runs the request_finished cleanup, and an
+            # idle SQLite connection would pin an old WAL snapshot
+            connections.close_all()
+    return run
+
+
+async def gather_queries(*functions):
+    """
+    Call the functions concurrently and return their results in order.
+
+    Inside a transaction (ATOMIC_REQUESTS, tests) another connection couldn't
+    see its uncommitted rows, so the functions then run one after another
+    on the request's own connection instead.
+    """
+    in_transaction = await sync_to_async(lambda: connection.in_atomic_block)()
+    if in_transaction:
+        return [await sync_to_async(function)() for function in functions]
+    return await asyncio.gather(*(
+        sync_to_async(_in_worker(function), thread_sensitive=False)()
+        for function in functions
+    ))
@@ -0,0 +1,106 @@
+"""
+Versioned cache entries for the catalog: the rendered book cards on the
+home page and the author/genre lookup lists behind the filter dropdowns.
+
+A card fragment is cached under (BookID, book version, catalog version)
+plus the book's copy counters, a lookup list under (name, version). The
+counters change on every reservation, return and count fix, often from
+another process or a management command; keying on the values the page
+just read means those never show a stale card. Writes bump a version instead of
+deleting entries: the old entry is never looked up again and simply ages
+out of the cache.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_CARD_TIMEOUT = 60 * 60 * 24
+DEFAULT_LOOKUP_TIMEOUT = 60 * 60
+
+# Bumped when an author or genre changes - their names are on every card
+CATALOG_VERSION_KEY = 'book_card_version:catalog'
+
+
+def _version_key(book_id):
+    return f'book_card_version:{book_id}'
+
+
+def _new_version():
+    # Start from the clock rather than 0, so a version key that was evicted
+    # never comes back at a number an old fragment is still stored under
+    return time.time_ns()
+
+
+def card_cache_timeout():
+    return getattr(settings, 'BOOK_CARD_CACHE_TIMEOUT', DEFAULT_CARD_TIMEOUT)
+
+
+def add_card_versions(books):
+    """Set book.card_version on each book of a page, in one cache round trip"""
+    books_by_key = {_version_key(book.BookID): book for book in books}
+    keys = [*books_by_key, CATALOG_VERSION_KEY]
+
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+
+    catalog_version = versions[CATALOG_VERSION_KEY]
+    for key, book in books_by_key.items():
+        book.card_version = f'{versions[key]}.{catalog_version}'
+    return books
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not cached yet - the next read starts a fresh version anyway
+            pass
+
+
+def invalidate_book_cards(*book_ids):
+    """
+    Retire the cached cards of these books. Runs once the transaction
+    commits, so a concurrent request can't re-cache the old data under
+    the new version.
+    """
+    keys = [_version_key(book_id) for book_id in book_ids]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_catalog_cards():
+    """Retire every cached card, e.g. after an author or genre is renamed"""
+    transaction.on_commit(lambda: _bump([CATALOG_VERSION_KEY]))
+
+
+def _lookup_version_key(name):
+    return f'lookup_version:{name}'
+
+
+def cached_lookup(name, build):
+    """
+    Return the cached list for `name` ('authors', 'genres'), calling build()
+    to load it from the database when the current version isn't cached.
+    """
+    version_key = _lookup_version_key(name)
+    version = cache.get(version_key)
+    if version is None:
+        version = _new_version()
+        cache.set(version_key, version, timeout=None)
+
+    key = f'lookup:{name}:{version}'
+    value = cache.get(key)
+    if value is None:
+        value = list(build())
+        cache.set(key, value, getattr(settings, 'LOOKUP_CACHE_TIMEOUT', DEFAULT_LOOKUP_TIMEOUT))
+    return value
+
+
+def invalidate_lookup(name):
+    """Drop the cached lookup list once the transaction commits"""
+    transaction.on_commit(lambda: _bump([_lookup_version_key(name)]))
@@ -0,0 +1,261 @@
+"""
+Bulk catalog import from CSV or JSON Lines files.
+
+Each row describes one book: title, isbn, author ("First Last" or
+"Last, First"), genre, publication_date (YYYY-MM-DD), cover_url and copies.
+Rows are read one at a time and inserted `batch_size` books per
+transaction, so memory stays flat however long the file is - only the
+lookup dictionaries below grow with the catalog:
+
+- authors and genres are matched (case-insensitively) against dictionaries
+  loaded once up front; missing ones are bulk-created with their batch
+- ISBNs are checked against one set holding every ISBN already in the
+  catalog plus those imported so far, so duplicates cost no queries
+"""
+import csv
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from Books.catalog_cache import invalidate_lookup
+from Books.models import Author, Genre, Book, BookCopy
+
+BATCH_SIZE = 2000
+MAX_COPIES = 100
+# Only the first few bad rows are kept for the report, the rest are counted
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.json': 'jsonl',
+}
+
+_validate_url = URLValidator()
+
+
+def detect_format(filename):
+    """'csv' or 'jsonl' from the file extension, None when it isn't recognised"""
+    for extension, fmt in FORMATS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+    return None
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a text stream. Column names are
+    lower-cased; a JSON line that isn't an object comes through as None.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if isinstance(row, dict):
+                row = {str(key).strip().lower(): value for key, value in row.items()}
+            else:
+                row = None
+            yield line_no, row
+    else:
+        raise ValueError(f'Unknown import format: {fmt}')
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def split_author_name(name):
+    """(first name, last name) from "First Last" or "Last, First" """
+    if ',' in name:
+        last, first = (part.strip() for part in name.split(',', 1))
+    elif ' ' in name:
+        first, last = name.rsplit(' ', 1)
+    else:
+        first, last = '', name
+    return first.strip(), last.strip()
+
+
+def parse_row(row):
+    """Validate one row, returning the cleaned values or raising ValueError"""
+    if row is None:
+        raise ValueError('Not a valid JSON object.')
+
+    title = _text(row, 'title')
+    isbn = _text(row, 'isbn')
+    author = _text(row, 'author')
+    genre = _text(row, 'genre')
+    if not title:
+        raise ValueError('Title is required.')
+    if len(title) > 255:
+        raise ValueError('Title is longer than 255 characters.')
+    if not isbn:
+        raise ValueError('ISBN is required.')
+    if len(isbn) > 13:
+        raise ValueError('ISBN is longer than 13 characters.')
+    if not author:
+        raise ValueError('Author is required.')
+    if not genre:
+        raise ValueError('Genre is required.')
+    if len(genre) > 100:
+        raise ValueError('Genre is longer than 100 characters.')
+
+    first_name, last_name = split_author_name(author)
+    if len(first_name) > 100 or len(last_name) > 100:
+        raise ValueError('Author name is longer than 100 characters.')
+
+    publication_date = _text(row, 'publication_date')
+    try:
+        publication_date = date.fromisoformat(publication_date) if publication_date else None
+    except ValueError:
+        raise ValueError(f'Invalid publication date "{publication_date}", expected YYYY-MM-DD.')
+
+    cover_url = _text(row, 'cover_url') or None
+    if cover_url:
+        try:
+            _validate_url(cover_url)
+        except ValidationError:
+            raise ValueError('Invalid cover URL.')
+        if len(cover_url) > 500:
+            raise ValueError('Cover URL is longer than 500 characters.')
+
+    copies = _text(row, 'copies') or '1'
+    try:
+        copies = int(copies)
+    except ValueError:
+        raise ValueError('Invalid number of copies.')
+    if not 0 <= copies <= MAX_COPIES:
+        raise ValueError(f'Number of copies must be between 0 and {MAX_COPIES}.')
+
+    return {
+        'title': title,
+        'isbn': isbn,
+        'author': (first_name, last_name),
+        'genre': genre,
+        'publication_date': publication_date,
+        'cover_url': cover_url,
+        'copies': copies,
+    }
+
+
+def _author_key(first_name, last_name):
+    return first_name.casefold(), last_name.casefold()
+
+
+def _insert_batch(batch, author_ids, genre_ids, counts):
+    with transaction.atomic():
+        new_authors = {}
+        new_genres = {}
+        for book in batch:
+            key = _author_key(*book['author'])
+            if key not in author_ids:
+                new_authors.setdefault(key, book['author'])
+            name = book['genre'].casefold()
+            if name not in genre_ids:
+                new_genres.setdefault(name, book['genre'])
+
+        if new_authors:
+            created = Author.objects.bulk_create([
+                Author(FirstName=first_name, LastName=last_name)
+                for first_name, last_name in new_authors.values()
+            ])
+            author_ids.update(zip(new_authors, (author.AuthorID for author in created)))
+            counts['authors'] += len(created)
+        if new_genres:
+            created = Genre.objects.bulk_create([Genre(Name=name) for name in new_genres.values()])
+            genre_ids.update(zip(new_genres, (genre.GenreID for genre in created)))
+            counts['genres'] += len(created)
+
+        # Every copy starts out Available, so the counters are known up front
+        created_books = Book.objects.bulk_create([
+            Book(
+                Title=book['title'],
+                ISBN=book['isbn'],
+                Author_id=author_ids[_author_key(*book['author'])],
+                Genre_id=genre_ids[book['genre'].casefold()],
+                PublicationDate=book['publication_date'],
+                CoverImageURL=book['cover_url'],
+                TotalCopies=book['copies'],
+                AvailableCopies=book['copies'],
+            )
+            for book in batch
+        ])
+        created_copies = BookCopy.objects.bulk_create([
+            BookCopy(Book_id=created.BookID, Status='Available')
+            for created, book in zip(created_books, batch)
+            for _ in range(book['copies'])
+        ], batch_size=BATCH_SIZE)
+
+    counts['books'] += len(created_books)
+    counts['copies'] += len(created_copies)
+
+
+def import_catalog(rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    Import the (line number, row) pairs from read_rows() and return
+    (counts, errors), errors being (line number, message) of rejected rows.
+
+    Rows whose ISBN is already in the catalog (or earlier in the file) are
+    skipped. Each batch is its own transaction: a failure leaves the
+    earlier batches imported. `progress(counts)` is called after every batch.
+    """
+    counts = dict.fromkeys(['rows', 'books', 'copies', 'authors', 'genres', 'duplicates', 'invalid'], 0)
+    errors = []
+
+    isbns = set(Book.objects.values_list('ISBN', flat=True))
+    author_ids = {
+        _author_key(first_name, last_name): author_id
+        for author_id, first_name, last_name in Author.objects.values_list('AuthorID', 'FirstName', 'LastName')
+    }
+    genre_ids = {name.casefold(): genre_id for genre_id, name in Genre.objects.values_list('GenreID', 'Name')}
+
+    batch = []
+    try:
+        for line_no, row in rows:
+            counts['rows'] += 1
+            try:
+                book = parse_row(row)
+            except ValueError as e:
+                counts['invalid'] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((line_no, str(e)))
+                continue
+
+            if book['isbn'] in isbns:
+                counts['duplicates'] += 1
+                continue
+            isbns.add(book['isbn'])
+
+            batch.append(book)
+            if len(batch) >= batch_size:
+                _insert_batch(batch, author_ids, genre_ids, counts)
+                batch = []
+                if progress:
+                    progress(counts)
+
+        if batch:
+            _insert_batch(batch, author_ids, genre_ids, counts)
+            if progress:
+                progress(counts)
+    finally:
+        # New names show up in the filter and form dropdowns
+        if counts['authors']:
+            invalidate_lookup('authors')
+        if counts['genres']:
+            invalidate_lookup('genres')
+
+    return counts, errors
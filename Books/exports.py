@@ -0,0 +1,170 @@
+"""
+Streaming CSV / JSON Lines exports of the catalog, the reservation history
+and the overdue report.
+
+Rows are read with QuerySet.iterator(chunk_size=...) and written out as
+they arrive, so an export holds one chunk of rows in memory however large
+the table. The catalog columns match what catalog_import reads, so an
+exported catalog can be imported into another instance.
+"""
+import csv
+import json
+
+from django.db.models import F
+from django.utils import timezone
+
+from Books.models import Book, OverdueItem
+
+CHUNK_SIZE = 2000
+# Lines are sent in blocks of about this many characters rather than one by one
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'jsonl': ('jsonl', 'application/x-ndjson; charset=utf-8'),
+}
+
+CATALOG_COLUMNS = [
+    'book_id', 'title', 'isbn', 'author', 'genre', 'publication_date', 'cover_url', 'copies',
+    'available', 'reserved', 'rented', 'damaged', 'lost',
+]
+RESERVATION_COLUMNS = [
+    'reservation_id', 'reserved_at', 'expires_at', 'status', 'phase', 'user_email', 'user_name',
+    'book_id', 'title', 'isbn', 'copy_id', 'rented_at', 'due_date', 'returned_at',
+]
+OVERDUE_COLUMNS = [
+    'type', 'overdue_since', 'days_overdue', 'user_email', 'user_name', 'book_id', 'title', 'isbn',
+    'copy_id', 'reservation_id', 'rental_id',
+]
+
+
+def _full_name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+def catalog_rows(chunk_size=CHUNK_SIZE):
+    books = Book.objects.order_by('BookID').values(
+        'BookID', 'Title', 'ISBN', 'Author__FirstName', 'Author__LastName', 'Genre__Name',
+        'PublicationDate', 'CoverImageURL', 'TotalCopies', 'AvailableCopies', 'ReservedCopies',
+        'RentedCopies', 'DamagedCopies', 'LostCopies',
+    )
+    for book in books.iterator(chunk_size=chunk_size):
+        yield {
+            'book_id': book['BookID'],
+            'title': book['Title'],
+            'isbn': book['ISBN'],
+            'author': _full_name(book['Author__FirstName'], book['Author__LastName']),
+            'genre': book['Genre__Name'],
+            'publication_date': book['PublicationDate'],
+            'cover_url': book['CoverImageURL'],
+            'copies': book['TotalCopies'],
+            'available': book['AvailableCopies'],
+            'reserved': book['ReservedCopies'],
+            'rented': book['RentedCopies'],
+            'damaged': book['DamagedCopies'],
+            'lost': book['LostCopies'],
+        }
+
+
+def reservation_rows(reservations, chunk_size=CHUNK_SIZE):
+    """
+    Rows for an ordered Reservation queryset, with the linked rental and its
+    return joined in (a reservation has at most one of each).
+    """
+    values = reservations.values(
+        'ReservationID', 'ReservationTime', 'ExpiryTime', 'Status', 'Phase',
+        'User__Email', 'User__FirstName', 'User__LastName', 'Book_id', 'Book__Title', 'Book__ISBN',
+        rental_copy_id=F('rental__Copy_id'),
+        rental_time=F('rental__RentTime'),
+        rental_due_date=F('rental__DueDate'),
+        return_time=F('rental__return__ReturnTime'),
+    )
+    for reservation in values.iterator(chunk_size=chunk_size):
+        yield {
+            'reservation_id': reservation['ReservationID'],
+            'reserved_at': reservation['ReservationTime'],
+            'expires_at': reservation['ExpiryTime'],
+            'status': reservation['Status'],
+            'phase': reservation['Phase'],
+            'user_email': reservation['User__Email'],
+            'user_name': _full_name(reservation['User__FirstName'], reservation['User__LastName']),
+            'book_id': reservation['Book_id'],
+            'title': reservation['Book__Title'],
+            'isbn': reservation['Book__ISBN'],
+            'copy_id': reservation['rental_copy_id'],
+            'rented_at': reservation['rental_time'],
+            'due_date': reservation['rental_due_date'],
+            'returned_at': reservation['return_time'],
+        }
+
+
+def overdue_rows(chunk_size=CHUNK_SIZE):
+    """The rows of the overdue page, oldest first"""
+    now = timezone.now()
+    items = OverdueItem.objects.order_by('OverdueSince', 'OverdueItemID').values(
+        'Type', 'OverdueSince', 'User__Email', 'User__FirstName', 'User__LastName',
+        'Book_id', 'Book__Title', 'Book__ISBN', 'Copy_id', 'Reservation_id', 'Rental_id',
+    )
+    for item in items.iterator(chunk_size=chunk_size):
+        yield {
+            'type': item['Type'],
+            'overdue_since': item['OverdueSince'],
+            'days_overdue': (now - item['OverdueSince']).days,
+            'user_email': item['User__Email'],
+            'user_name': _full_name(item['User__FirstName'], item['User__LastName']),
+            'book_id': item['Book_id'],
+            'title': item['Book__Title'],
+            'isbn': item['Book__ISBN'],
+            'copy_id': item['Copy_id'],
+            'reservation_id': item['Reservation_id'],
+            'rental_id': item['Rental_id'],
+        }
+
+
+class _Echo:
+    """File-like object that hands back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _lines(columns, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_csv_value(row[column]) for column in columns])
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row, default=_json_default, ensure_ascii=False) + '\n'
+    else:
+        raise ValueError(f'Unknown export format: {fmt}')
+
+
+def export_lines(columns, rows, fmt):
+    """The export as text blocks of roughly BUFFER_SIZE characters"""
+    block = []
+    size = 0
+    for line in _lines(columns, rows, fmt):
+        block.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield ''.join(block)
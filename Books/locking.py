@@ -0,0 +1,100 @@
+"""
+Retrying write transactions that the database turned away as locked.
+
+With transaction_mode IMMEDIATE and a busy timeout (see DATABASES in
+settings) a writer already waits for the lock when its transaction starts.
+If it is still held when the timeout runs out, SQLite raises
+"database is locked"; retry_on_lock() then runs the whole transaction
+again after a short, growing, jittered pause instead of failing the request.
+
+Settings (all optional):
+    DATABASE_LOCK_RETRIES  extra attempts after the first one (default 3)
+    DATABASE_LOCK_BACKOFF  seconds before the first retry, doubled each time (default 0.05)
+"""
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.05
+
+_lock = threading.Lock()
+_stats = {'retried': 0, 'gave_up': 0}
+
+
+def is_lock_error(exc):
+    """'database is locked' / 'database table is locked' from SQLite"""
+    return isinstance(exc, OperationalError) and 'is locked' in str(exc)
+
+
+def _record(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def lock_retry_stats():
+    """How many transactions were retried, and how many failed after the last retry"""
+    with _lock:
+        return dict(_stats)
+
+
+def reset_lock_retry_stats():
+    with _lock:
+        _stats.update(retried=0, gave_up=0)
+
+
+def call_with_retry(function, using=DEFAULT_DB_ALIAS):
+    """
+    Call function(), which runs one transaction, and call it again when it
+    fails on a lock. Inside an outer atomic block a retry would only repeat
+    part of that transaction, so there the error goes straight up.
+    """
+    if connections[using].in_atomic_block:
+        return function()
+
+    retries = getattr(settings, 'DATABASE_LOCK_RETRIES', DEFAULT_RETRIES)
+    backoff = getattr(settings, 'DATABASE_LOCK_BACKOFF', DEFAULT_BACKOFF)
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except OperationalError as exc:
+            if not is_lock_error(exc):
+                raise
+            if attempt == retries:
+                _record('gave_up')
+                logger.warning('Transaction still locked out after %d retries', retries)
+                raise
+            _record('retried')
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.info('Database locked, retrying in %.0f ms', delay * 1000)
+            time.sleep(delay)
+
+
+def retry_on_lock(view_func=None, *, using=DEFAULT_DB_ALIAS):
+    """
+    Decorator for write views. Put it outside @transaction.atomic so each
+    attempt is a complete transaction of its own:
+
+        @admin_required
+        @retry_on_lock
+        @transaction.atomic
+        def issue_book(request, reservation_id):
+
+    The view runs again from the start, so it should not have side effects
+    outside the database before its transaction commits (on_commit hooks
+    are fine: a rolled back attempt discards them).
+    """
+    if view_func is None:
+        return lambda func: retry_on_lock(func, using=using)
+
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        return call_with_retry(lambda: view_func(*args, **kwargs), using=using)
+    return wrapper
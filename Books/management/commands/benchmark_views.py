@@ -0,0 +1,200 @@
+import json
+import platform
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from Account.models import Account, ADMIN_ROLE_ID
+from Account.throttling import DEFAULT_RATES
+from Books.async_queries import worker_execute_wrapper
+from Books.models import Book, Reservation, Rental
+from Books.synthetic import SEED_PASSWORD, bulk_load, seed_library, throwaway_database
+
+
+def logged_in_client(account):
+    client = Client(SERVER_NAME='localhost')
+    session = client.session
+    session['user_id'] = account.UserID
+    session.save()
+    # Signed cookie sessions get a new key whenever their data changes
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return client
+
+
+class QueryCounter:
+    """
+    execute_wrapper that counts queries on every connection it is installed on.
+    The async views run part of their queries on worker connections
+    (gather_queries), which CaptureQueriesContext(connection) would miss.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self):
+        with connection.execute_wrapper(self), worker_execute_wrapper(self):
+            yield self
+
+
+def measure_login(email, password, repeat):
+    """
+    Time `repeat` logins to one account. The login-account bucket only holds
+    a handful of attempts, so the rates are raised for the runs: the
+    throttle still takes its tokens, but no run is timed as a 429.
+    """
+    rates = {scope: f'{repeat * 1000}/min' for scope in DEFAULT_RATES}
+    data = {'email': email, 'password': password}
+    with override_settings(THROTTLE_RATES=rates):
+        # Logging in needs a fresh, anonymous client every time
+        return measure(lambda: Client(SERVER_NAME='localhost').post(reverse('login'), data), repeat)
+
+
+def measure(make_request, repeat):
+    """Call make_request() `repeat` times; returns status, queries, bytes and wall times of the runs"""
+    timings = []
+    queries = []
+    response = None
+    for _ in range(repeat):
+        with QueryCounter().installed() as counter:
+            start = time.perf_counter()
+            response = make_request()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+
+    return {
+        'status': response.status_code,
+        'queries': max(queries),
+        'bytes': len(response.content),
+        'wall_ms': {
+            'min': round(min(timings), 2),
+            'median': round(statistics.median(timings), 2),
+            'max': round(max(timings), 2),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway synthetic library and measure query count, wall time and '
+        'response size of the main views. Prints JSON for tracking regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reservations', type=int, default=None,
+                            help='Defaults to two per book')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per view')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        reservations = options['reservations']
+        if reservations is None:
+            reservations = options['books'] * 2
+
+        with throwaway_database():
+            started = time.perf_counter()
+            with bulk_load():
+                counts = seed_library(
+                    books=options['books'], copies_per_book=options['copies_per_book'],
+                    users=options['users'], reservations=reservations, seed=options['seed'],
+                )
+            seed_seconds = time.perf_counter() - started
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            results = self.run_benchmarks(repeat)
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key]
+                for key in ('books', 'copies_per_book', 'users', 'seed', 'repeat')
+            },
+            'dataset': counts,
+            'seed_seconds': round(seed_seconds, 2),
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Wrote {len(results)} results to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, repeat):
+        admin = Account.objects.filter(Role_id=ADMIN_ROLE_ID).first()
+        user = Account.objects.filter(
+            Role_id=1, reservation__isnull=False
+        ).order_by('UserID').first() or Account.objects.filter(Role_id=1).first()
+        admin_client = logged_in_client(admin)
+        user_client = logged_in_client(user)
+
+        book = Book.objects.order_by('BookID').first()
+        search_term = book.Title.split()[0] if book else 'a'
+
+        # A reservation still waiting to be issued, and un-returned rentals to process
+        pending = Reservation.objects.filter(Status='Active', Phase='Reserved').first()
+        open_rentals = list(
+            Rental.objects.filter(return__isnull=True)
+            .order_by('RentalID').values_list('RentalID', flat=True)[:repeat]
+        )
+
+        cases = [
+            ('home', 'admin', lambda: admin_client.get(reverse('home'))),
+            ('home', 'user', lambda: user_client.get(reverse('home'))),
+            ('home?search', 'user', lambda: user_client.get(reverse('home'), {'search': search_term})),
+            ('author_autocomplete', 'user', lambda: user_client.get(reverse('author_autocomplete'), {'q': 'a'})),
+            ('reservations', 'admin', lambda: admin_client.get(reverse('reservations'))),
+            ('reservations', 'user', lambda: user_client.get(reverse('reservations'))),
+            ('overdue', 'admin', lambda: admin_client.get(reverse('overdue'))),
+        ]
+        if book:
+            cases.append(('edit_book', 'admin', lambda: admin_client.get(reverse('edit_book', args=[book.BookID]))))
+        if pending:
+            cases.append(('issue_book', 'admin', lambda: admin_client.get(reverse('issue_book', args=[pending.ReservationID]))))
+
+        results = []
+        for view, role, make_request in cases:
+            self.stderr.write(f'Benchmarking {view} ({role})...')
+            results.append({'view': view, 'role': role, **measure(make_request, repeat)})
+
+        self.stderr.write('Benchmarking login (anonymous)...')
+        results.append({'view': 'login', 'role': 'anonymous', **measure_login(user.Email, SEED_PASSWORD, repeat)})
+
+        # Returns mutate data, so each run processes a different rental
+        if open_rentals:
+            rental_ids = iter(open_rentals)
+            self.stderr.write('Benchmarking process_return (admin)...')
+            results.append({
+                'view': 'process_return', 'role': 'admin',
+                **measure(lambda: admin_client.post(reverse('process_return', args=[next(rental_ids)])), len(open_rentals)),
+            })
+
+        return results
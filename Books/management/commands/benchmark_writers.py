@@ -0,0 +1,179 @@
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from Books.locking import call_with_retry, is_lock_error, lock_retry_stats, reset_lock_retry_stats
+from Books.models import Book, BookCopy, COPY_STATUS_COUNTERS
+from Books.synthetic import bulk_load, seed_library, throwaway_database
+
+# 'stock': Django's plain SQLite setup - rollback journal, deferred
+# transactions, a new connection per request and no retries.
+# 'tuned': the OPTIONS and connection settings from DATABASES['default'], on a
+# WAL database like migrate leaves behind.
+PROFILES = ('stock', 'tuned')
+
+
+def profile_settings(profile, name):
+    default = settings.DATABASES['default']
+    if profile == 'stock':
+        database = {'ENGINE': default['ENGINE'], 'NAME': name}
+    else:
+        database = {**default, 'NAME': name}
+    # Fills in the defaults (ATOMIC_REQUESTS, TIME_ZONE, ...) like for DATABASES
+    return connections.configure_settings({'default': database})['default']
+
+
+def toggle_copy(alias, book_id):
+    """
+    What reserve_book / cancel_reservation do to a copy: read an available
+    copy, flip its status and shift the book's counters, in one transaction
+    """
+    with transaction.atomic(using=alias):
+        copies = BookCopy.objects.using(alias).filter(Book_id=book_id)
+        copy = copies.filter(Status='Available').first() or copies.filter(Status='Reserved').first()
+        if copy is None:
+            return
+        old, new = ('Available', 'Reserved') if copy.Status == 'Available' else ('Reserved', 'Available')
+        copy.Status = new
+        copy.save(using=alias, update_fields=['Status'])
+        Book.objects.using(alias).filter(BookID=book_id).update(**{
+            COPY_STATUS_COUNTERS[old]: F(COPY_STATUS_COUNTERS[old]) - 1,
+            COPY_STATUS_COUNTERS[new]: F(COPY_STATUS_COUNTERS[new]) + 1,
+        })
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure write throughput with several threads reserving and releasing copies at '
+        'once, on a copy of a synthetic library, with Django\'s stock SQLite setup and with '
+        'the tuned one from settings. Prints JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transactions', type=int, default=200, help='Per thread')
+        parser.add_argument('--books', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--profile', choices=PROFILES, action='append',
+                            help='Profile to run (repeatable); defaults to all of them')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite setups; the default database is not SQLite.')
+        profiles = options['profile'] or list(PROFILES)
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'source.sqlite3')
+            self.stderr.write(f'Seeding {options["books"]} books...')
+            with throwaway_database():
+                with bulk_load():
+                    seed_library(books=options['books'], users=20, seed=options['seed'])
+                book_ids = list(Book.objects.values_list('BookID', flat=True))
+                connection.ensure_connection()
+                with sqlite3.connect(source) as target:
+                    connection.connection.backup(target)
+                target.close()
+
+            results = []
+            for profile in profiles:
+                name = os.path.join(directory, f'{profile}.sqlite3')
+                shutil.copyfile(source, name)
+                self.stderr.write(f'Running {profile}...')
+                results.append({'profile': profile, **self.run_profile(profile, name, book_ids, options)})
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'options': {key: options[key] for key in ('threads', 'transactions', 'books', 'seed')},
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Wrote {len(results)} results to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_profile(self, profile, name, book_ids, options):
+        alias = f'benchmark-{profile}'
+        connections.settings[alias] = profile_settings(profile, name)
+        # The journal mode is stored in the file: migrate switches a real database
+        # to WAL (Books.models.use_wal_journal), a copy of the in-memory test database isn't
+        with sqlite3.connect(name) as db:
+            db.execute(f'PRAGMA journal_mode = {"DELETE" if profile == "stock" else "WAL"}')
+        db.close()
+
+        threads = max(1, options['threads'])
+        start = threading.Barrier(threads + 1)
+        timings = []
+        errors = []
+        results_lock = threading.Lock()
+
+        def worker(number):
+            rng = random.Random(options['seed'] * 1000 + number)
+            mine, failed = [], []
+            start.wait()
+            for _ in range(options['transactions']):
+                book_id = rng.choice(book_ids)
+                began = time.perf_counter()
+                try:
+                    if profile == 'tuned':
+                        call_with_retry(lambda: toggle_copy(alias, book_id), using=alias)
+                    else:
+                        toggle_copy(alias, book_id)
+                except OperationalError as exc:
+                    if not is_lock_error(exc):
+                        raise
+                    failed.append(str(exc))
+                else:
+                    mine.append((time.perf_counter() - began) * 1000)
+                finally:
+                    # What the request_finished signal does after every request
+                    connections[alias].close_if_unusable_or_obsolete()
+            connections[alias].close()
+            with results_lock:
+                timings.extend(mine)
+                errors.extend(failed)
+
+        pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        for thread in pool:
+            thread.start()
+        reset_lock_retry_stats()
+        start.wait()
+        began = time.perf_counter()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        retries = lock_retry_stats()
+
+        timings.sort()
+        return {
+            'committed': len(timings),
+            'failed': len(errors),
+            'retried': retries['retried'],
+            'seconds': round(elapsed, 3),
+            'transactions_per_second': round(len(timings) / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'median': round(statistics.median(timings), 2),
+                'p95': round(timings[int(len(timings) * 0.95) - 1], 2),
+                'max': round(timings[-1], 2),
+            } if timings else None,
+        }
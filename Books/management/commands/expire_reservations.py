@@ -0,0 +1,84 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Books.catalog_cache import invalidate_book_cards
+from Books.models import BookCopy, OverdueItem, Reservation, shift_copy_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Mark Active reservations that were never picked up and are past their expiry '
+        'as Expired, and put their reserved copies back on the shelf'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would expire')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, sweeping every N seconds (default: sweep once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['dry_run'], options['batch_size'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, dry_run, batch_size):
+        started = time.perf_counter()
+        now = timezone.now()
+        # Served by the partial index on ExpiryTime of Active reservations
+        expired = Reservation.objects.filter(Status='Active', Phase='Reserved', ExpiryTime__lt=now)
+
+        total = 0
+        batches = 0
+        last_id = 0
+        while True:
+            # One transaction per batch keeps the write lock short
+            with transaction.atomic():
+                batch = list(
+                    expired.select_for_update()
+                    .filter(ReservationID__gt=last_id)
+                    .order_by('ReservationID')
+                    .only('ReservationID', 'Book_id')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].ReservationID
+                batches += 1
+                total += len(batch)
+
+                if dry_run:
+                    continue
+
+                batch_ids = [r.ReservationID for r in batch]
+                Reservation.objects.filter(ReservationID__in=batch_ids).update(Status='Expired', Phase='Cancelled')
+                # No longer waiting for pickup, so off the overdue page
+                OverdueItem.objects.filter(Type='reservation', Reservation_id__in=batch_ids).delete()
+
+                # Each expired reservation was holding one Reserved copy of its book
+                per_book = Counter(r.Book_id for r in batch)
+                for book_id, count in per_book.items():
+                    copy_ids = list(
+                        BookCopy.objects.select_for_update()
+                        .filter(Book_id=book_id, Status='Reserved')
+                        .values_list('CopyID', flat=True)[:count]
+                    )
+                    if copy_ids:
+                        BookCopy.objects.filter(CopyID__in=copy_ids).update(Status='Available')
+                        shift_copy_counts(book_id, 'Reserved', 'Available', len(copy_ids))
+                invalidate_book_cards(*per_book)
+
+        elapsed = time.perf_counter() - started
+        if dry_run:
+            self.stdout.write(f'{total} reservations would expire (dry run, nothing changed), checked in {elapsed:.2f}s.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Expired {total} reservations in {batches} batches, {elapsed:.2f}s.'
+            ))
@@ -0,0 +1,111 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from Books.models import Book, BookCopy, Rental, Reservation
+from Books.overdue import new_expired_reservations, new_late_rentals
+from Books.pagination import DEFAULT_PAGE_SIZE
+from Books.synthetic import bulk_load, seed_library, throwaway_database
+
+INDEXED_MODELS = [Book, BookCopy, Rental, Reservation]
+
+
+def hot_queries():
+    """The home listing and the filters reserve_book, reservations, refresh_overdue and issue_book run"""
+    now = timezone.now()
+    sample = Reservation.objects.order_by('ReservationID').values('User_id', 'Book_id').first() or {
+        'User_id': 1, 'Book_id': 1,
+    }
+    user_id, book_id = sample['User_id'], sample['Book_id']
+    listing = Book.objects.select_related('Author', 'Genre').order_by('Title', 'BookID')
+    middle = listing.values('Title', 'BookID')[Book.objects.count() // 2:][:1].first() or {'Title': '', 'BookID': 0}
+
+    return {
+        'home: first page': listing[:DEFAULT_PAGE_SIZE + 1],
+        'home: page after a cursor': listing.filter(
+            Q(Title__gte=middle['Title']) &
+            (Q(Title__gt=middle['Title']) | Q(Title=middle['Title'], BookID__gt=middle['BookID']))
+        )[:DEFAULT_PAGE_SIZE + 1],
+        'reserve_book: active reservation exists': Reservation.objects.filter(
+            User_id=user_id, Book_id=book_id, Status='Active'
+        ),
+        'reserve_book: first available copy': BookCopy.objects.filter(
+            Book_id=book_id, Status='Available'
+        )[:1],
+        'issue_book: first reserved copy': BookCopy.objects.filter(
+            Book_id=book_id, Status='Reserved'
+        )[:1],
+        'reservations: phase filter': Reservation.objects.filter(Phase='Rented'),
+        # What refresh_overdue_items() looks for on each run
+        'refresh_overdue: expired reservations': new_expired_reservations(now),
+        'refresh_overdue: rentals past due': new_late_rentals(now),
+    }
+
+
+def summarize(plan):
+    """Reduce an EXPLAIN QUERY PLAN to 'SCAN table' / 'SEARCH table USING INDEX ...' / sort lines"""
+    lines = []
+    for line in plan.splitlines():
+        # SQLite rows come back as "<id> <parent> <unused> <detail>"
+        line = re.sub(r'^[\s|`-]*(\d+ \d+ \d+ )?', '', line)
+        if 'SCAN' in line or 'SEARCH' in line or 'TEMP B-TREE' in line:
+            lines.append(line)
+    return '; '.join(lines) or plan.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Print EXPLAIN plans for the home listing and reservation/rental hot queries, with and without '
+        'the composite indexes, on a throwaway seeded database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Explain against the configured database instead of a seeded throwaway copy '
+                 '(indexes are left untouched)'
+        )
+
+    def handle(self, *args, **options):
+        if options['current_db']:
+            self.report('current database', self.explain_all())
+            return
+
+        with throwaway_database():
+            self.stdout.write(f'Seeding {options["books"]} books into a throwaway database...')
+            with bulk_load():
+                counts = seed_library(
+                    books=options['books'], users=options['users'],
+                    reservations=options['books'] * 2, seed=options['seed'],
+                )
+            self.stdout.write(', '.join(f'{n} {name}' for name, n in counts.items()))
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            with_indexes = self.explain_all()
+
+            with connection.schema_editor() as editor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        editor.remove_index(model, index)
+            without_indexes = self.explain_all()
+
+        for name in with_indexes:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f'  without indexes: {without_indexes[name]}')
+            self.stdout.write(f'  with indexes:    {with_indexes[name]}')
+
+    def explain_all(self):
+        return {name: summarize(queryset.explain()) for name, queryset in hot_queries().items()}
+
+    def report(self, title, plans):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, plan in plans.items():
+            self.stdout.write(f'  {name}: {plan}')
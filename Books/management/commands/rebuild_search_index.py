@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from Books.search import (
+    SEARCH_TABLE, create_search_index, install_search_triggers, rebuild_search_index,
+    search_index_supported,
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index used by the catalog search box'
+
+    def handle(self, *args, **options):
+        if not search_index_supported():
+            raise CommandError('The search index is only available on SQLite.')
+
+        with transaction.atomic():
+            if SEARCH_TABLE in connection.introspection.table_names():
+                # Puts back the triggers too, in case they were dropped
+                install_search_triggers()
+                count = rebuild_search_index()
+            else:
+                count = create_search_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books.'))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Books.catalog_cache import invalidate_book_cards
+from Books.models import Book, COPY_STATUS_COUNTERS, count_copies
+
+COUNTER_COLUMNS = ['TotalCopies', *COPY_STATUS_COUNTERS.values()]
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-book copy counters with the BookCopy rows and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not fix it')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        zero = dict.fromkeys(COUNTER_COLUMNS, 0)
+
+        checked = 0
+        drifted = 0
+        last_id = 0
+        while True:
+            # Walk the catalog in BookID order so memory stays bounded
+            with transaction.atomic():
+                books = list(
+                    Book.objects.select_for_update()
+                    .filter(BookID__gt=last_id)
+                    .order_by('BookID')
+                    .only('BookID', 'Title', *COUNTER_COLUMNS)[:batch_size]
+                )
+                if not books:
+                    break
+                last_id = books[-1].BookID
+                actual = count_copies([book.BookID for book in books])
+
+                to_fix = []
+                for book in books:
+                    expected = actual.get(book.BookID, zero)
+                    diffs = {
+                        column: (getattr(book, column), expected[column])
+                        for column in COUNTER_COLUMNS
+                        if getattr(book, column) != expected[column]
+                    }
+                    if diffs:
+                        drifted += 1
+                        details = ', '.join(f'{col} {old} -> {new}' for col, (old, new) in diffs.items())
+                        self.stdout.write(f'Book {book.BookID} "{book.Title}": {details}')
+                        for column, (_, new) in diffs.items():
+                            setattr(book, column, new)
+                        to_fix.append(book)
+
+                if to_fix and not dry_run:
+                    Book.objects.bulk_update(to_fix, COUNTER_COLUMNS)
+                    invalidate_book_cards(*[book.BookID for book in to_fix])
+
+                checked += len(books)
+
+        if dry_run:
+            self.stdout.write(f'Checked {checked} books, {drifted} with drifted counters (dry run, nothing changed).')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} books, repaired {drifted}.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Books.overdue import refresh_overdue_items
+
+
+class Command(BaseCommand):
+    help = (
+        'Add reservations and rentals that have gone overdue to the OverdueItem table '
+        'behind the admin overdue page, and drop rows that were resolved'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, refreshing every N seconds (default: refresh once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            added, removed = refresh_overdue_items()
+            self.stdout.write(self.style.SUCCESS(
+                f'Overdue items: {added} added, {removed} removed in {time.perf_counter() - started:.2f}s.'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
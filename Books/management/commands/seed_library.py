@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Books.synthetic import bulk_load, seed_library
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a synthetic library (authors, genres, books, copies, '
+        'accounts and reservation/rental/return history) for load testing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reservations', type=int, default=None,
+                            help='Total reservations to generate (default: two per book)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed - the same options always generate the same data')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Books generated and committed per transaction')
+
+    def handle(self, *args, **options):
+        books = options['books']
+        reservations = options['reservations']
+        if reservations is None:
+            reservations = books * 2
+
+        self.started = time.perf_counter()
+        with bulk_load():
+            counts = seed_library(
+                books=books,
+                copies_per_book=options['copies_per_book'],
+                users=options['users'],
+                reservations=reservations,
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                progress=self.report_progress,
+            )
+            self.stdout.write('Rebuilding the search index...')
+
+        elapsed = time.perf_counter() - self.started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 0.001):.0f} rows/s): '
+            + ', '.join(f'{n} {name}' for name, n in counts.items())
+        ))
+
+    def report_progress(self, counts):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'  {counts["books"]} books, {counts["copies"]} copies, '
+            f'{counts["reservations"]} reservations ({elapsed:.1f}s)'
+        )
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from Books.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Books', '0002_alter_rental_copy'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
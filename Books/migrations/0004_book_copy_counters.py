@@ -0,0 +1,86 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+from Books.search import drop_search_triggers, install_search_triggers
+
+COUNTERS = {
+    'Available': 'AvailableCopies',
+    'Reserved': 'ReservedCopies',
+    'Rented': 'RentedCopies',
+    'Damaged': 'DamagedCopies',
+    'Lost': 'LostCopies',
+}
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model('Books', 'Book')
+    BookCopy = apps.get_model('Books', 'BookCopy')
+
+    counts = {}
+    rows = BookCopy.objects.values('Book_id', 'Status').annotate(n=Count('CopyID')).order_by()
+    for row in rows:
+        book_counts = counts.setdefault(row['Book_id'], {})
+        book_counts['TotalCopies'] = book_counts.get('TotalCopies', 0) + row['n']
+        column = COUNTERS.get(row['Status'])
+        if column:
+            book_counts[column] = book_counts.get(column, 0) + row['n']
+
+    books = list(Book.objects.filter(BookID__in=counts.keys()))
+    for book in books:
+        for column, value in counts[book.BookID].items():
+            setattr(book, column, value)
+    Book.objects.bulk_update(books, ['TotalCopies', *COUNTERS.values()], batch_size=500)
+
+
+def drop_triggers(apps, schema_editor):
+    # SQLite rebuilds Books_book to add the columns, which the triggers would block
+    drop_search_triggers(schema_editor.connection)
+
+
+def install_triggers(apps, schema_editor):
+    # Reinstalled with the update trigger narrowed to the indexed columns,
+    # so counter updates don't reindex the book
+    install_search_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Books', '0003_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_triggers, install_triggers),
+        migrations.AddField(
+            model_name='book',
+            name='TotalCopies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='AvailableCopies',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='ReservedCopies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='RentedCopies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='DamagedCopies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='LostCopies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.RunPython(install_triggers, drop_triggers),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Account', '0002_alter_account_phone'),
+        ('Books', '0004_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(fields=['Book', 'Status'], name='bookcopy_book_status'),
+        ),
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['DueDate'], name='rental_due_date'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['User', 'Book', 'Status'], name='reservation_user_book_status'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('Status', 'Active')), fields=['ExpiryTime'], name='reservation_active_expiry'),
+        ),
+    ]
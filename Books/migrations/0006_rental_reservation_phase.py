@@ -0,0 +1,89 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from bisect import bisect_right
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def backfill_links(apps, schema_editor):
+    """
+    Link existing rentals to the reservation they were issued for and store
+    each reservation's phase - the same matching the views used to redo on
+    every request: a rental belongs to the user's latest non-cancelled
+    reservation of the book made at or before the rent time.
+    """
+    Reservation = apps.get_model('Books', 'Reservation')
+    Rental = apps.get_model('Books', 'Rental')
+    Return = apps.get_model('Books', 'Return')
+
+    user_ids = list(Reservation.objects.values_list('User_id', flat=True).distinct().order_by('User_id'))
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+
+        reservations = list(
+            Reservation.objects.filter(User_id__in=batch).order_by('ReservationTime', 'ReservationID')
+        )
+        by_pair = {}
+        for reservation in reservations:
+            if reservation.Status != 'Cancelled':
+                times, items = by_pair.setdefault((reservation.User_id, reservation.Book_id), ([], []))
+                times.append(reservation.ReservationTime)
+                items.append(reservation)
+
+        rentals = list(
+            Rental.objects.filter(User_id__in=batch).select_related('Copy').order_by('RentTime', 'RentalID')
+        )
+        returned = set(
+            Return.objects.filter(Rental__User_id__in=batch).values_list('Rental_id', flat=True)
+        )
+
+        rental_of = {}
+        linked_rentals = []
+        for rental in rentals:
+            times, items = by_pair.get((rental.User_id, rental.Copy.Book_id), ([], []))
+            index = bisect_right(times, rental.RentTime)
+            # Latest earlier reservation that isn't already linked to a rental
+            while index and items[index - 1].ReservationID in rental_of:
+                index -= 1
+            if index:
+                reservation = items[index - 1]
+                rental_of[reservation.ReservationID] = rental
+                rental.Reservation_id = reservation.ReservationID
+                linked_rentals.append(rental)
+        Rental.objects.bulk_update(linked_rentals, ['Reservation'], batch_size=BATCH_SIZE)
+
+        for reservation in reservations:
+            rental = rental_of.get(reservation.ReservationID)
+            if reservation.Status == 'Cancelled':
+                reservation.Phase = 'Cancelled'
+            elif reservation.Status == 'Completed' or (rental and rental.RentalID in returned):
+                reservation.Phase = 'Returned'
+            elif rental:
+                reservation.Phase = 'Rented'
+            else:
+                reservation.Phase = 'Reserved'
+        Reservation.objects.bulk_update(reservations, ['Phase'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Books', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rental',
+            name='Reservation',
+            field=models.ForeignKey(blank=True, db_column='ReservationID', null=True, on_delete=django.db.models.deletion.SET_NULL, to='Books.reservation'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='Phase',
+            field=models.CharField(db_index=True, default='Reserved', max_length=20),
+        ),
+        migrations.RunPython(backfill_links, migrations.RunPython.noop),
+    ]
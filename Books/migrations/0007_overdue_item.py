@@ -0,0 +1,62 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_overdue_items(apps, schema_editor):
+    """Start the table off with what is overdue now; refresh_overdue keeps it current afterwards"""
+    OverdueItem = apps.get_model('Books', 'OverdueItem')
+    Reservation = apps.get_model('Books', 'Reservation')
+    Rental = apps.get_model('Books', 'Rental')
+    now = timezone.now()
+
+    expired = Reservation.objects.filter(
+        Status='Active', Phase='Reserved', ExpiryTime__lt=now
+    ).values_list('ReservationID', 'User_id', 'Book_id', 'ExpiryTime')
+    late = Rental.objects.filter(
+        DueDate__lt=now, return__isnull=True
+    ).values_list('RentalID', 'User_id', 'Copy__Book_id', 'Copy_id', 'Reservation_id', 'DueDate')
+
+    OverdueItem.objects.bulk_create([
+        OverdueItem(
+            Type='reservation', Reservation_id=reservation_id, User_id=user_id,
+            Book_id=book_id, OverdueSince=expiry_time,
+        )
+        for reservation_id, user_id, book_id, expiry_time in expired
+    ] + [
+        OverdueItem(
+            Type='rental', Rental_id=rental_id, User_id=user_id, Book_id=book_id,
+            Copy_id=copy_id, Reservation_id=reservation_id, OverdueSince=due_date,
+        )
+        for rental_id, user_id, book_id, copy_id, reservation_id, due_date in late
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Account', '0002_alter_account_phone'),
+        ('Books', '0006_rental_reservation_phase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueItem',
+            fields=[
+                ('OverdueItemID', models.AutoField(primary_key=True, serialize=False)),
+                ('Type', models.CharField(max_length=20)),
+                ('OverdueSince', models.DateTimeField()),
+                ('Book', models.ForeignKey(db_column='BookID', on_delete=django.db.models.deletion.CASCADE, to='Books.book')),
+                ('Copy', models.ForeignKey(blank=True, db_column='CopyID', null=True, on_delete=django.db.models.deletion.CASCADE, to='Books.bookcopy')),
+                ('Rental', models.OneToOneField(blank=True, db_column='RentalID', null=True, on_delete=django.db.models.deletion.CASCADE, to='Books.rental')),
+                ('Reservation', models.ForeignKey(blank=True, db_column='ReservationID', null=True, on_delete=django.db.models.deletion.CASCADE, to='Books.reservation')),
+                ('User', models.ForeignKey(db_column='UserID', on_delete=django.db.models.deletion.CASCADE, related_name='overdue_items', to='Account.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('Type', 'reservation')), fields=('Reservation',), name='overdueitem_unique_reservation')],
+            },
+        ),
+        migrations.RunPython(fill_overdue_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def number_existing_copies(apps, schema_editor):
+    """Number each book's copies 1, 2, 3... in CopyID order, in one UPDATE"""
+    BookCopy = apps.get_model('Books', 'BookCopy')
+    earlier_or_same = BookCopy.objects.filter(
+        Book=OuterRef('Book'), CopyID__lte=OuterRef('CopyID')
+    ).order_by().values('Book').annotate(n=Count('pk')).values('n')
+    BookCopy.objects.update(Sequence=Subquery(earlier_or_same))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Books', '0007_overdue_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookcopy',
+            name='Sequence',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(number_existing_copies, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookcopy',
+            name='Sequence',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='bookcopy',
+            constraint=models.UniqueConstraint(fields=('Book', 'Sequence'), name='bookcopy_book_sequence'),
+        ),
+    ]
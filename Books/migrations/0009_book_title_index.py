@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Books', '0008_bookcopy_sequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['Title', 'BookID'], name='book_title_id'),
+        ),
+    ]
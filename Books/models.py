@@ -1,5 +1,18 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import F, Q, Case, Count, Max, Value, When
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
 from Account.models import Account
+from Books.catalog_cache import cached_lookup
+
+# Copy status -> Book counter column that tracks how many copies are in it
+COPY_STATUS_COUNTERS = {
+    'Available': 'AvailableCopies',
+    'Reserved': 'ReservedCopies',
+    'Rented': 'RentedCopies',
+    'Damaged': 'DamagedCopies',
+    'Lost': 'LostCopies',
+}
 
 
 class Author(models.Model):
@@ -21,12 +34,51 @@ class Book(models.Model):
     Title = models.CharField(max_length=255)
     PublicationDate = models.DateField(null=True, blank=True)
     CoverImageURL = models.URLField(max_length=500, null=True, blank=True)
+    # Denormalized copy counts, kept in step with BookCopy.Status by shift_copy_counts()
+    TotalCopies = models.PositiveIntegerField(default=0)
+    AvailableCopies = models.PositiveIntegerField(default=0, db_index=True)
+    ReservedCopies = models.PositiveIntegerField(default=0)
+    RentedCopies = models.PositiveIntegerField(default=0)
+    DamagedCopies = models.PositiveIntegerField(default=0)
+    LostCopies = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Home page listing: ORDER BY Title, BookID with a keyset seek past the last row
+            models.Index(fields=['Title', 'BookID'], name='book_title_id'),
+        ]
+
+
+class BookCopyQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        number_copies(objs)
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class BookCopy(models.Model):
     CopyID = models.AutoField(primary_key=True)
     Book = models.ForeignKey(Book, on_delete=models.CASCADE, db_column='BookID')
     Status = models.CharField(max_length=20, default='Available')
+    # Copy number within the book (1, 2, 3...), shown to staff and used for ordering.
+    # New copies continue after the highest number, existing copies keep theirs.
+    Sequence = models.PositiveIntegerField()
+
+    objects = BookCopyQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # reserve_book / issue_book / cancel_reservation: "a copy of this book in status X"
+            models.Index(fields=['Book', 'Status'], name='bookcopy_book_status'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['Book', 'Sequence'], name='bookcopy_book_sequence'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.Sequence is None:
+            number_copies([self])
+        super().save(*args, **kwargs)
 
 
 class Rental(models.Model):
@@ -36,6 +88,14 @@ class Rental(models.Model):
     ProcessedByUser = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='processed_rentals', db_column='ProcessedByUserID')
     RentTime = models.DateTimeField(auto_now_add=True)
     DueDate = models.DateTimeField()
+    # The reservation this rental was issued for, set by issue_book
+    Reservation = models.ForeignKey('Reservation', on_delete=models.SET_NULL, null=True, blank=True, db_column='ReservationID')
+
+    class Meta:
+        indexes = [
+            # overdue: rentals past their due date
+            models.Index(fields=['DueDate'], name='rental_due_date'),
+        ]
 
 
 class Return(models.Model):
@@ -51,4 +111,154 @@ class Reservation(models.Model):
     Book = models.ForeignKey(Book, on_delete=models.CASCADE, db_column='BookID')
     ReservationTime = models.DateTimeField(auto_now_add=True)
     ExpiryTime = models.DateTimeField()
-    Status = models.CharField(max_length=20, default='Active')
\ No newline at end of file
+    Status = models.CharField(max_length=20, default='Active')
+    # Where the reservation is in its lifecycle: Reserved -> Rented -> Returned, or Cancelled.
+    # Kept up to date by issue_book, process_return and cancel_reservation.
+    Phase = models.CharField(max_length=20, default='Reserved', db_index=True)
+
+    class Meta:
+        indexes = [
+            # reserve_book / process_return: a user's reservations of a book in a given status
+            models.Index(fields=['User', 'Book', 'Status'], name='reservation_user_book_status'),
+            # overdue: only active reservations can expire, so index just those
+            models.Index(fields=['ExpiryTime'], condition=Q(Status='Active'), name='reservation_active_expiry'),
+        ]
+
+
+
+class OverdueItem(models.Model):
+    """
+    One row per currently overdue reservation (expired, never picked up) or
+    rental (past due, not returned). Rows are added by the refresh_overdue
+    command and deleted by the views that resolve them, so the overdue page
+    is a plain indexed read. See Books/overdue.py.
+    """
+    OverdueItemID = models.AutoField(primary_key=True)
+    Type = models.CharField(max_length=20)  # 'reservation' or 'rental'
+    User = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='overdue_items', db_column='UserID')
+    Book = models.ForeignKey(Book, on_delete=models.CASCADE, db_column='BookID')
+    Copy = models.ForeignKey(BookCopy, on_delete=models.CASCADE, null=True, blank=True, db_column='CopyID')
+    Reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, null=True, blank=True, db_column='ReservationID')
+    Rental = models.OneToOneField(Rental, on_delete=models.CASCADE, null=True, blank=True, db_column='RentalID')
+    OverdueSince = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # A reservation is listed at most once while it waits for pickup
+            models.UniqueConstraint(
+                fields=['Reservation'], condition=Q(Type='reservation'), name='overdueitem_unique_reservation'
+            ),
+        ]
+
+
+def number_copies(copies):
+    """
+    Give the copies that don't have a Sequence yet the next free numbers of
+    their book - one grouped query for however many books they belong to.
+    """
+    unnumbered = [copy for copy in copies if copy.Sequence is None]
+    if not unnumbered:
+        return
+    book_ids = list({copy.Book_id for copy in unnumbered})
+    last = {}
+    # Chunked to stay under SQLite's limit on query parameters
+    for start in range(0, len(book_ids), 500):
+        last.update(
+            BookCopy.objects.filter(Book_id__in=book_ids[start:start + 500])
+            .order_by().values_list('Book_id').annotate(last=Max('Sequence'))
+        )
+    for copy in unnumbered:
+        last[copy.Book_id] = (last.get(copy.Book_id) or 0) + 1
+        copy.Sequence = last[copy.Book_id]
+
+
+def _counter_updates(from_status, to_status, delta):
+    """Column updates that move `delta` copies from one status counter to another"""
+    updates = {}
+    if from_status is None:
+        updates['TotalCopies'] = F('TotalCopies') + delta
+    elif from_status in COPY_STATUS_COUNTERS:
+        column = COPY_STATUS_COUNTERS[from_status]
+        updates[column] = F(column) - delta
+
+    if to_status is None:
+        updates['TotalCopies'] = F('TotalCopies') - delta
+    elif to_status in COPY_STATUS_COUNTERS:
+        column = COPY_STATUS_COUNTERS[to_status]
+        updates[column] = F(column) + delta
+    return updates
+
+
+def shift_copy_counts(book_id, from_status=None, to_status=None, count=1):
+    """
+    Move `count` copies of a book between status counters in a single UPDATE.
+    from_status=None means the copies are new, to_status=None means they were removed.
+    Call it inside the same transaction that changes BookCopy.Status.
+    """
+    updates = _counter_updates(from_status, to_status, count)
+    if from_status == to_status or not updates:
+        return
+    Book.objects.filter(BookID=book_id).update(**updates)
+
+
+def shift_copy_counts_many(counts, from_status=None, to_status=None):
+    """shift_copy_counts() for many books at once - `counts` is {book_id: count}, still one UPDATE"""
+    if not counts:
+        return
+    delta = Case(
+        *[When(BookID=book_id, then=Value(count)) for book_id, count in counts.items()],
+        default=Value(0), output_field=models.IntegerField()
+    )
+    updates = _counter_updates(from_status, to_status, delta)
+    if from_status == to_status or not updates:
+        return
+    Book.objects.filter(BookID__in=list(counts)).update(**updates)
+
+
+def count_copies(book_ids=None):
+    """Recompute the copy counters from BookCopy rows: {book_id: {column: count}}"""
+    copies = BookCopy.objects.all()
+    if book_ids is not None:
+        copies = copies.filter(Book_id__in=book_ids)
+
+    counts = {}
+    for row in copies.values('Book_id', 'Status').annotate(n=Count('CopyID')).order_by():
+        book_counts = counts.setdefault(row['Book_id'], dict.fromkeys(
+            ['TotalCopies', *COPY_STATUS_COUNTERS.values()], 0
+        ))
+        book_counts['TotalCopies'] += row['n']
+        column = COPY_STATUS_COUNTERS.get(row['Status'])
+        if column:
+            book_counts[column] += row['n']
+    return counts
+
+
+def author_choices():
+    """All authors as dicts for <select> lists, served from the lookup cache"""
+    return cached_lookup('authors', lambda: Author.objects.order_by('LastName', 'FirstName').values(
+        'AuthorID', 'FirstName', 'LastName'
+    ))
+
+
+def genre_choices():
+    """All genres as dicts for <select> lists, served from the lookup cache"""
+    return cached_lookup('genres', lambda: Genre.objects.order_by('Name').values('GenreID', 'Name'))
+
+
+def set_wal_journal(connection):
+    """
+    Switch a SQLite database to write-ahead logging. The journal mode is
+    stored in the database file, so it is set once after migrate rather than
+    by every new connection (see DATABASES in settings).
+    """
+    # In-memory databases have no WAL, and SQLite can't switch inside a transaction
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db() or connection.in_atomic_block:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = WAL')
+
+
+@receiver(post_migrate)
+def use_wal_journal(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender.name == 'Books':
+        set_wal_journal(connections[using])
@@ -0,0 +1,89 @@
+"""
+Upkeep of the OverdueItem table behind the admin overdue page.
+
+refresh_overdue_items() runs periodically (manage.py refresh_overdue): it
+adds rows for reservations and rentals that went overdue since the last
+run and drops rows whose item was resolved some other way. The views that
+resolve an item (issue, return, cancel, date changes) delete its row
+straight away with clear_overdue_items().
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from Books.models import OverdueItem, Rental, Reservation, Return
+
+BATCH_SIZE = 1000
+
+
+def clear_overdue_items(reservation_id=None, rental_id=None):
+    """
+    Delete the overdue rows of a reservation and/or rental. Rental rows carry
+    the Reservation_id they were issued from too, so the reservation branch
+    only matches the reservation's own (expired pickup) row.
+    """
+    condition = Q()
+    if reservation_id is not None:
+        condition |= Q(Type='reservation', Reservation_id=reservation_id)
+    if rental_id is not None:
+        condition |= Q(Rental_id=rental_id)
+    if condition:
+        OverdueItem.objects.filter(condition).delete()
+
+
+def new_expired_reservations(now):
+    """Reservations that expired without being picked up and have no overdue row yet"""
+    return Reservation.objects.filter(
+        Status='Active', Phase='Reserved', ExpiryTime__lt=now
+    ).exclude(
+        Exists(OverdueItem.objects.filter(Type='reservation', Reservation=OuterRef('pk')))
+    )
+
+
+def new_late_rentals(now):
+    """Rentals past their due date that haven't come back and have no overdue row yet"""
+    return Rental.objects.filter(
+        DueDate__lt=now, return__isnull=True
+    ).exclude(
+        Exists(OverdueItem.objects.filter(Rental=OuterRef('pk')))
+    )
+
+
+def refresh_overdue_items(now=None):
+    """Bring the table up to date. Returns (added, removed)."""
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        # Rows whose item isn't overdue anymore but wasn't cleared by a view
+        removed, _ = OverdueItem.objects.filter(
+            Q(Type='rental') & (
+                Q(Exists(Return.objects.filter(Rental=OuterRef('Rental')))) | Q(Rental__DueDate__gte=now)
+            ) |
+            Q(Type='reservation') & ~Q(
+                Reservation__Status='Active', Reservation__Phase='Reserved', Reservation__ExpiryTime__lt=now
+            )
+        ).delete()
+
+        expired = new_expired_reservations(now).values_list('ReservationID', 'User_id', 'Book_id', 'ExpiryTime')
+        late = new_late_rentals(now).values_list(
+            'RentalID', 'User_id', 'Copy__Book_id', 'Copy_id', 'Reservation_id', 'DueDate'
+        )
+
+        # Materialise the (small) id tuples first - SQLite would otherwise read
+        # the table we are inserting into through the NOT EXISTS subquery
+        new_items = [
+            OverdueItem(
+                Type='reservation', Reservation_id=reservation_id, User_id=user_id,
+                Book_id=book_id, OverdueSince=expiry_time,
+            )
+            for reservation_id, user_id, book_id, expiry_time in list(expired)
+        ] + [
+            OverdueItem(
+                Type='rental', Rental_id=rental_id, User_id=user_id, Book_id=book_id,
+                Copy_id=copy_id, Reservation_id=reservation_id, OverdueSince=due_date,
+            )
+            for rental_id, user_id, book_id, copy_id, reservation_id, due_date in list(late)
+        ]
+        OverdueItem.objects.bulk_create(new_items, batch_size=BATCH_SIZE)
+
+    return len(new_items), removed
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE):
+    """Read ?page_size= from the request, clamped to a sane range"""
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row into an opaque URL-safe token"""
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Inverse of encode_cursor. Returns None for missing or tampered tokens."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def _cursor_values(queryset, order_fields, values):
+    """
+    Convert decoded cursor values to the types of their fields (or
+    annotations). Returns None if any of them doesn't fit, so a tampered
+    cursor falls back to the first page instead of failing in the query.
+    """
+    if values is None:
+        return None
+    cleaned = []
+    for field_name, value in zip(order_fields, values):
+        # encode_cursor only writes scalars; sort keys are never NULL
+        if value is None or isinstance(value, (list, dict)):
+            return None
+        annotation = queryset.query.annotations.get(field_name)
+        try:
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(field_name)
+            cleaned.append(field.to_python(value))
+        except (FieldDoesNotExist, ValidationError):
+            return None
+    return cleaned
+
+
+def keyset_page(queryset, order_fields, cursor, page_size):
+    """
+    Seek pagination: return (rows, next_cursor) for the rows after `cursor`.
+
+    `order_fields` must be ascending and end with a unique column, e.g.
+    ('Title', 'BookID'), so every row has a distinct position. Instead of
+    OFFSET (which makes the database walk every skipped row) we filter on
+    "sort key greater than the last row seen", which an index on the order
+    fields can seek to (Book has one on (Title, BookID)).
+    """
+    queryset = queryset.order_by(*order_fields)
+
+    values = _cursor_values(queryset, order_fields, decode_cursor(cursor, len(order_fields)))
+    if values is not None:
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        after = Q()
+        for i, field in enumerate(order_fields):
+            condition = Q(**{f'{field}__gt': values[i]})
+            for prev_field, prev_value in zip(order_fields[:i], values[:i]):
+                condition &= Q(**{prev_field: prev_value})
+            after |= condition
+        # Implied by the OR above, but gives the database a range to seek to
+        queryset = queryset.filter(Q(**{f'{order_fields[0]}__gte': values[0]}) & after)
+
+    # Fetch one extra row to know whether there is a next page
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field) for field in order_fields])
+
+    return rows, next_cursor
@@ -0,0 +1,225 @@
+from contextlib import contextmanager
+
+from django.db import connection, DatabaseError
+from django.db.models import Q, FloatField
+from django.db.models.expressions import RawSQL
+
+# Full-text index over the catalog (SQLite FTS5).
+# rowid of the index is the BookID, so a match maps straight back to a Book.
+SEARCH_TABLE = 'Books_book_fts'
+
+# Relevance: a title hit counts most, then ISBN and author, then genre (lower is better)
+RANK_FUNCTION = f"bm25({SEARCH_TABLE}, 10.0, 5.0, 5.0, 1.0)"
+
+_BOOK_ROW_SELECT = """
+    SELECT b.BookID, b.Title, b.ISBN,
+           a.FirstName || ' ' || a.LastName,
+           g.Name
+    FROM Books_book b
+    JOIN Books_author a ON a.AuthorID = b.AuthorID
+    JOIN Books_genre g ON g.GenreID = b.GenreID
+"""
+
+# Only the indexed columns - copy counter updates must not reindex the book
+BOOK_UPDATE_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS Books_book_fts_au
+    AFTER UPDATE OF Title, ISBN, AuthorID, GenreID ON Books_book BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.BookID;
+        INSERT INTO {SEARCH_TABLE}(rowid, title, isbn, author, genre)
+        {_BOOK_ROW_SELECT} WHERE b.BookID = NEW.BookID;
+    END
+"""
+
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, isbn, author, genre,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+# Note: SQLite refuses to rename a table that a trigger references, so any
+# migration that rebuilds Books_book, Books_author or Books_genre has to call
+# drop_search_triggers() before and install_search_triggers() after.
+TRIGGER_STATEMENTS = [
+    # Keep the index in sync with Book rows
+    f"""
+    CREATE TRIGGER IF NOT EXISTS Books_book_fts_ai AFTER INSERT ON Books_book BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, title, isbn, author, genre)
+        {_BOOK_ROW_SELECT} WHERE b.BookID = NEW.BookID;
+    END
+    """,
+    BOOK_UPDATE_TRIGGER,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS Books_book_fts_ad AFTER DELETE ON Books_book BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.BookID;
+    END
+    """,
+    # Renaming an author or genre changes the indexed text of all their books
+    f"""
+    CREATE TRIGGER IF NOT EXISTS Books_author_fts_au AFTER UPDATE ON Books_author BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid IN (
+            SELECT BookID FROM Books_book WHERE AuthorID = NEW.AuthorID
+        );
+        INSERT INTO {SEARCH_TABLE}(rowid, title, isbn, author, genre)
+        {_BOOK_ROW_SELECT} WHERE b.AuthorID = NEW.AuthorID;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS Books_genre_fts_au AFTER UPDATE ON Books_genre BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid IN (
+            SELECT BookID FROM Books_book WHERE GenreID = NEW.GenreID
+        );
+        INSERT INTO {SEARCH_TABLE}(rowid, title, isbn, author, genre)
+        {_BOOK_ROW_SELECT} WHERE b.GenreID = NEW.GenreID;
+    END
+    """,
+]
+
+DROP_TRIGGER_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS Books_genre_fts_au",
+    "DROP TRIGGER IF EXISTS Books_author_fts_au",
+    "DROP TRIGGER IF EXISTS Books_book_fts_ad",
+    "DROP TRIGGER IF EXISTS Books_book_fts_au",
+    "DROP TRIGGER IF EXISTS Books_book_fts_ai",
+]
+
+
+def search_index_supported(conn=None):
+    """The index is SQLite-only; other databases fall back to icontains"""
+    conn = conn or connection
+    return conn.vendor == 'sqlite'
+
+
+def install_search_triggers(conn=None):
+    conn = conn or connection
+    if not search_index_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in TRIGGER_STATEMENTS:
+            cursor.execute(statement)
+
+
+def drop_search_triggers(conn=None):
+    conn = conn or connection
+    if not search_index_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in DROP_TRIGGER_STATEMENTS:
+            cursor.execute(statement)
+
+
+def create_search_index(conn=None):
+    """
+    Create the FTS table and its sync triggers (if missing), then fill it.
+    Returns the number of indexed books.
+    """
+    conn = conn or connection
+    if not search_index_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+    install_search_triggers(conn)
+    return rebuild_search_index(conn)
+
+
+def drop_search_index(conn=None):
+    conn = conn or connection
+    if not search_index_supported(conn):
+        return
+    drop_search_triggers(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+@contextmanager
+def deferred_search_index(conn=None):
+    """
+    For loads that insert many books: the sync triggers are dropped for the
+    block and the index rebuilt once afterwards, instead of being updated
+    row by row. Other writers' changes in the meantime are picked up by the
+    rebuild too.
+    """
+    conn = conn or connection
+    has_index = search_index_supported(conn) and SEARCH_TABLE in conn.introspection.table_names()
+    if has_index:
+        drop_search_triggers(conn)
+    try:
+        yield
+    finally:
+        if has_index:
+            install_search_triggers(conn)
+            rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn=None):
+    """Repopulate the index from scratch. Returns the number of indexed books."""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, title, isbn, author, genre) {_BOOK_ROW_SELECT}"
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so "harry pot" matches "Harry Potter"
+    and user input can never inject FTS syntax.
+    """
+    terms = []
+    for word in query.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def _has_match(expression):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT 1", [expression])
+        return cursor.fetchone() is not None
+
+
+def filter_books(books, query):
+    """
+    Restrict a Book queryset to the search query.
+    Uses the full-text index when available and adds a `search_rank`
+    annotation (lower = better match); otherwise falls back to icontains lookups.
+    The index is joined in the same query, so every match is listed and paged
+    through without passing lists of ids around.
+    """
+    if search_index_supported():
+        expression = build_match_expression(query)
+        try:
+            found = bool(expression) and _has_match(expression)
+        except DatabaseError:
+            # Index missing (e.g. migrations not applied yet) - use the slow path
+            found = None
+
+        if found is not None:
+            if not found:
+                return books.none()
+            book_table = books.model._meta.db_table
+            # Join the index once: SQLite walks the matches and looks each
+            # book up by its primary key, and bm25() reads the joined row
+            return books.extra(
+                tables=[SEARCH_TABLE],
+                where=[
+                    f'"{SEARCH_TABLE}" MATCH %s',
+                    f'"{SEARCH_TABLE}".rowid = "{book_table}"."BookID"',
+                ],
+                params=[expression],
+            ).annotate(
+                search_rank=RawSQL(RANK_FUNCTION, [], output_field=FloatField())
+            ).order_by('search_rank')
+
+    return books.filter(
+        Q(Title__icontains=query) |
+        Q(Author__FirstName__icontains=query) |
+        Q(Author__LastName__icontains=query) |
+        Q(ISBN__icontains=query) |
+        Q(Genre__Name__icontains=query)
+    )
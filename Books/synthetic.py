@@ -0,0 +1,297 @@
+"""
+Synthetic library data for benchmarks and load tests.
+
+Everything is generated from a seeded random.Random, so the same arguments
+always produce the same catalog and circulation history.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from Account.models import Account
+from Books.models import (
+    Author, Genre, Book, BookCopy, Reservation, Rental, Return, COPY_STATUS_COUNTERS,
+)
+from Books.overdue import refresh_overdue_items
+from Books.search import deferred_search_index
+
+WORDS = [
+    'Silent', 'River', 'Garden', 'Night', 'Winter', 'Stone', 'Light', 'Shadow', 'House', 'Sea',
+    'Forest', 'Letter', 'Song', 'Journey', 'Secret', 'Mirror', 'Island', 'Bridge', 'Storm', 'Dream',
+    'Amber', 'Baltic', 'Crown', 'Harbor', 'Meadow', 'Lantern', 'Orchard', 'Voyage', 'Whisper', 'Echo',
+]
+FIRST_NAMES = ['Anna', 'Jānis', 'Līga', 'Pēteris', 'Marta', 'Andris', 'Ilze', 'Kārlis', 'Rūta', 'Edgars']
+LAST_NAMES = ['Bērziņš', 'Kalniņa', 'Ozols', 'Liepa', 'Krūmiņš', 'Zariņa', 'Vītols', 'Eglīte', 'Sproģis', 'Purina']
+GENRES = [
+    'Fiction', 'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'History',
+    'Biography', 'Poetry', 'Drama', 'Children', 'Science', 'Philosophy', 'Travel', 'Art',
+]
+
+# Share of reservations ending up in each phase
+PHASE_WEIGHTS = {
+    'Returned': 55,
+    'Rented': 15,
+    'Reserved': 20,
+    'Cancelled': 10,
+}
+
+SEED_PASSWORD = 'password'
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create keep the historical times we generate instead of auto_now_add"""
+    fields = [
+        Account._meta.get_field('CreatedAt'),
+        Reservation._meta.get_field('ReservationTime'),
+        Rental._meta.get_field('RentTime'),
+        Return._meta.get_field('ReturnTime'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a freshly migrated test database that is destroyed afterwards"""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def bulk_load():
+    """
+    Speed up loading synthetic data: suspend the search index triggers (the
+    index is rebuilt once at the end) and, on SQLite, skip fsync for the
+    duration - a crash can lose the load, which is fine for data that can be
+    generated again. The overdue table is brought up to date afterwards as well.
+    """
+    synchronous = None
+    # SQLite refuses to change the safety level inside a transaction
+    if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        with deferred_search_index():
+            yield
+    finally:
+        if synchronous is not None:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+        refresh_overdue_items()
+
+
+def _plan_book(rng, now, user_ids, copies_per_book, reservations_per_book):
+    """Copy statuses and circulation history for one book"""
+    statuses = []
+    for _ in range(max(1, copies_per_book + rng.randint(-1, 1))):
+        roll = rng.random()
+        statuses.append('Damaged' if roll < 0.02 else 'Lost' if roll < 0.03 else 'Available')
+
+    # Average reservations_per_book per book, e.g. 2.5 -> 2 or 3
+    count = int(reservations_per_book)
+    if rng.random() < reservations_per_book - count:
+        count += 1
+
+    # (user_id, phase, copy_index, reservation_time)
+    history = []
+    active_users = set()
+    phases = list(PHASE_WEIGHTS)
+    weights = list(PHASE_WEIGHTS.values())
+    for _ in range(count if user_ids else 0):
+        user_id = rng.choice(user_ids)
+        phase = rng.choices(phases, weights)[0]
+        copy_index = None
+
+        if phase in ('Reserved', 'Rented'):
+            available = [i for i, status in enumerate(statuses) if status == 'Available']
+            if not available or user_id in active_users:
+                phase = 'Cancelled'
+            else:
+                copy_index = rng.choice(available)
+                statuses[copy_index] = phase
+                active_users.add(user_id)
+        elif phase == 'Returned':
+            copy_index = rng.randrange(len(statuses))
+
+        if phase == 'Reserved':
+            reserved_at = now - timedelta(days=rng.uniform(0, 10))
+        elif phase == 'Rented':
+            reserved_at = now - timedelta(days=rng.uniform(2, 40))
+        else:
+            reserved_at = now - timedelta(days=rng.uniform(20, 730))
+        history.append((user_id, phase, copy_index, reserved_at))
+
+    return statuses, history
+
+
+def seed_library(books=1000, copies_per_book=3, users=200, reservations=None, seed=0,
+                 batch_size=2000, progress=None):
+    """
+    Populate the database with a synthetic library and return row counts.
+
+    The circulation history mixes returned, rented (some overdue), reserved
+    (some expired) and cancelled reservations in PHASE_WEIGHTS proportions,
+    with copy statuses and the per-book counters matching it.
+
+    Rows are generated and inserted `batch_size` books at a time, one
+    transaction per batch, so memory stays flat however large the library.
+    `progress(counts)` is called after every batch.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    if reservations is None:
+        reservations = books
+    reservations_per_book = reservations / books if books else 0
+
+    counts = dict.fromkeys(
+        ['authors', 'genres', 'books', 'copies', 'users', 'reservations', 'rentals', 'returns'], 0
+    )
+
+    with explicit_timestamps():
+        genre_ids = [
+            Genre.objects.get_or_create(Name=name)[0].GenreID
+            for name in GENRES
+        ]
+        counts['genres'] = len(genre_ids)
+
+        author_ids = []
+        for chunk in _chunks(range(max(1, books // 10)), batch_size):
+            with transaction.atomic():
+                created = Author.objects.bulk_create([
+                    Author(FirstName=rng.choice(FIRST_NAMES), LastName=rng.choice(LAST_NAMES))
+                    for _ in chunk
+                ])
+            author_ids.extend(author.AuthorID for author in created)
+        counts['authors'] = len(author_ids)
+
+        # Accounts - hash the shared password once, hashing per row would dominate the run
+        password = make_password(SEED_PASSWORD)
+        first_user = (Account.objects.aggregate(m=Max('UserID'))['m'] or 0) + 1
+        user_ids = []
+        for chunk in _chunks(range(users), batch_size):
+            with transaction.atomic():
+                created = Account.objects.bulk_create([
+                    Account(
+                        FirstName=rng.choice(FIRST_NAMES),
+                        LastName=rng.choice(LAST_NAMES),
+                        Email=f'reader{first_user + i}@example.com',
+                        Phone=f'+371{first_user + i:08d}',
+                        Password=password,
+                        Role_id=1,
+                        CreatedAt=now - timedelta(days=rng.uniform(30, 1000)),
+                    )
+                    for i in chunk
+                ])
+            user_ids.extend(account.UserID for account in created)
+        counts['users'] = len(user_ids)
+
+        admin = Account.objects.filter(Role_id=2).first()
+        if admin is None:
+            admin = Account.objects.create(
+                FirstName='Seed', LastName='Admin', Email=f'admin{first_user}@example.com',
+                Phone=f'+372{first_user:08d}', Password=password, Role_id=2, CreatedAt=now,
+            )
+
+        first_book = (Book.objects.aggregate(m=Max('BookID'))['m'] or 0) + 1
+        for chunk in _chunks(range(books), batch_size):
+            book_objects = []
+            plans = []
+            for i in chunk:
+                statuses, history = _plan_book(rng, now, user_ids, copies_per_book, reservations_per_book)
+                plans.append((statuses, history))
+
+                # Counters derived from the planned copy statuses
+                counters = dict.fromkeys(COPY_STATUS_COUNTERS.values(), 0)
+                for status in statuses:
+                    counters[COPY_STATUS_COUNTERS[status]] += 1
+                book_objects.append(Book(
+                    Title=' '.join(rng.sample(WORDS, rng.randint(1, 4))),
+                    ISBN=f'999{first_book + i:010d}',
+                    Author_id=rng.choice(author_ids),
+                    Genre_id=rng.choice(genre_ids),
+                    PublicationDate=(now - timedelta(days=rng.uniform(0, 36500))).date(),
+                    TotalCopies=len(statuses),
+                    **counters,
+                ))
+
+            with transaction.atomic():
+                created_books = Book.objects.bulk_create(book_objects)
+                created_copies = BookCopy.objects.bulk_create([
+                    BookCopy(Book_id=book.BookID, Status=status)
+                    for book, (statuses, _) in zip(created_books, plans)
+                    for status in statuses
+                ])
+
+                reservation_objects = []
+                rental_objects = []
+                returned = []
+                position = 0
+                for book, (statuses, history) in zip(created_books, plans):
+                    copy_ids = [copy.CopyID for copy in created_copies[position:position + len(statuses)]]
+                    position += len(statuses)
+
+                    for user_id, phase, copy_index, reserved_at in history:
+                        status = {'Returned': 'Completed', 'Cancelled': 'Cancelled'}.get(phase, 'Active')
+                        reservation = Reservation(
+                            User_id=user_id,
+                            Book_id=book.BookID,
+                            ReservationTime=reserved_at,
+                            ExpiryTime=reserved_at + timedelta(days=7),
+                            Status=status,
+                            Phase=phase,
+                        )
+                        reservation_objects.append(reservation)
+                        if phase in ('Rented', 'Returned'):
+                            rented_at = reserved_at + timedelta(days=rng.uniform(0, 2))
+                            # Linked once bulk_create has given the reservation its primary key
+                            rental_objects.append(Rental(
+                                Copy_id=copy_ids[copy_index],
+                                User_id=user_id,
+                                ProcessedByUser_id=admin.UserID,
+                                RentTime=rented_at,
+                                DueDate=rented_at + timedelta(days=14),
+                                Reservation=reservation,
+                            ))
+                            returned.append(phase == 'Returned')
+
+                Reservation.objects.bulk_create(reservation_objects, batch_size=batch_size)
+                rentals = Rental.objects.bulk_create(rental_objects, batch_size=batch_size)
+                Return.objects.bulk_create([
+                    Return(
+                        Rental_id=rental.RentalID,
+                        ProcessedByUser_id=admin.UserID,
+                        ReturnTime=rental.RentTime + timedelta(days=rng.uniform(1, 20)),
+                    )
+                    for rental, is_returned in zip(rentals, returned) if is_returned
+                ], batch_size=batch_size)
+
+            counts['books'] += len(created_books)
+            counts['copies'] += len(created_copies)
+            counts['reservations'] += len(reservation_objects)
+            counts['rentals'] += len(rental_objects)
+            counts['returns'] += sum(returned)
+            if progress:
+                progress(counts)
+
+    return counts
@@ -1,3 +1,1032 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Account.models import Account
+from Books.models import (
+    Author, Genre, Book, BookCopy, OverdueItem, Rental, Reservation, Return, set_wal_journal,
+)
+from Books import exports, search
+from Books.async_queries import gather_queries
+from Books.management.commands.benchmark_views import measure, measure_login
+from Books.pagination import encode_cursor
+from Books.locking import call_with_retry, lock_retry_stats, reset_lock_retry_stats
+from Books.synthetic import seed_library
+
+
+def search_ids(query):
+    """BookIDs the catalog search finds, in the order the home page lists them"""
+    books = search.filter_books(Book.objects.all(), query)
+    if 'search_rank' in books.query.annotations:
+        books = books.order_by('search_rank', 'BookID')
+    return list(books.values_list('BookID', flat=True))
+
+
+def create_account(email='user@example.com', phone='20000000', role_id=1):
+    return Account.objects.create(
+        FirstName='Test', LastName='User', Email=email,
+        Phone=phone, Password='x', Role_id=role_id
+    )
+
+
+def log_in(client, account):
+    session = client.session
+    session['user_id'] = account.UserID
+    session.save()
+    # Signed cookie sessions get a new key whenever their data changes
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.tolkien = Author.objects.create(FirstName='John', LastName='Tolkien')
+        self.rowling = Author.objects.create(FirstName='Joanne', LastName='Rowling')
+        self.fantasy = Genre.objects.create(Name='Fantasy')
+        self.hobbit = Book.objects.create(
+            Title='The Hobbit', ISBN='9780261102217', Author=self.tolkien, Genre=self.fantasy
+        )
+        self.potter = Book.objects.create(
+            Title='Harry Potter', ISBN='9780747532699', Author=self.rowling, Genre=self.fantasy
+        )
+
+    def test_prefix_match_on_title(self):
+        self.assertEqual(search_ids('hob'), [self.hobbit.BookID])
+
+    def test_matches_author_and_isbn(self):
+        self.assertEqual(search_ids('rowl'), [self.potter.BookID])
+        self.assertEqual(search_ids('978026'), [self.hobbit.BookID])
+
+    def test_index_follows_updates(self):
+        self.hobbit.Title = 'There and Back Again'
+        self.hobbit.save()
+        self.assertEqual(search_ids('hobbit'), [])
+        self.assertEqual(search_ids('back again'), [self.hobbit.BookID])
+
+        self.tolkien.LastName = 'Tolkin'
+        self.tolkien.save()
+        self.assertEqual(search_ids('tolkin'), [self.hobbit.BookID])
+
+        self.potter.delete()
+        self.assertEqual(search_ids('harry'), [])
+
+    def test_deferred_index_is_rebuilt_after_the_block(self):
+        with search.deferred_search_index():
+            silmarillion = Book.objects.create(
+                Title='The Silmarillion', ISBN='9780261102736', Author=self.tolkien, Genre=self.fantasy
+            )
+            self.assertEqual(search_ids('silmarillion'), [])
+        self.assertEqual(search_ids('silmarillion'), [silmarillion.BookID])
+
+        # The triggers are back
+        self.hobbit.delete()
+        self.assertEqual(search_ids('hobbit'), [])
+
+    def test_rebuild_command_indexes_once(self):
+        def reindexing_queries(queries):
+            return [q for q in queries if q['sql'].startswith(f'INSERT INTO {search.SEARCH_TABLE}(rowid')]
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(reindexing_queries(queries)), 1)
+
+        # A dropped index is recreated, triggers included
+        search.drop_search_index()
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(len(reindexing_queries(queries)), 1)
+        self.assertIn('Indexed 2 books.', out.getvalue())
+        self.hobbit.delete()
+        self.assertEqual(search_ids('hobbit'), [])
+        self.assertEqual(search_ids('potter'), [self.potter.BookID])
+
+    def test_fts_syntax_is_escaped(self):
+        self.assertEqual(search_ids('"hobbit OR'), [])
+        self.assertEqual(search_ids('   '), [])
+
+    def test_home_uses_index(self):
+        log_in(self.client, create_account())
+
+        response = self.client.get(reverse('home'), {'search': 'potter'})
+        self.assertEqual([b.BookID for b in response.context['books']], [self.potter.BookID])
+
+    def test_search_pages_through_every_match_in_rank_order(self):
+        log_in(self.client, create_account())
+        for i in range(5):
+            Book.objects.create(
+                Title=f'Fantasy Tales {i}', ISBN=f'97800000001{i}', Author=self.rowling, Genre=self.fantasy
+            )
+
+        seen = []
+        params = {'search': 'fantasy', 'page_size': 2}
+        while True:
+            response = self.client.get(reverse('home'), params)
+            seen.extend(b.BookID for b in response.context['books'])
+            if not response.context['next_cursor']:
+                break
+            params['cursor'] = response.context['next_cursor']
+
+        # Title matches rank above the two books that only match on genre
+        self.assertEqual(seen, search_ids('fantasy'))
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(set(seen[-2:]), {self.hobbit.BookID, self.potter.BookID})
+
+
+class HomePaginationTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        # Two books share a title so the BookID tiebreaker is exercised
+        titles = ['Alpha', 'Bravo', 'Bravo', 'Charlie', 'Delta']
+        for i, title in enumerate(titles):
+            Book.objects.create(Title=title, ISBN=f'97800000000{i}', Author=author, Genre=genre)
+        log_in(self.client, create_account())
+
+    def test_keyset_pages_cover_catalog_once_in_order(self):
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            response = self.client.get(reverse('home'), params)
+            seen.extend((b.Title, b.BookID) for b in response.context['books'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            params['cursor'] = cursor
+
+        expected = list(Book.objects.order_by('Title', 'BookID').values_list('Title', 'BookID'))
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_clamped(self):
+        response = self.client.get(reverse('home'), {'page_size': 0})
+        self.assertEqual(len(response.context['books']), 1)
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        response = self.client.get(reverse('home'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['books'][0].Title, 'Alpha')
+
+    def test_cursor_with_wrong_value_types_starts_from_first_page(self):
+        for values in (['x', 'abc'], [None, 1], [['Alpha'], 1]):
+            response = self.client.get(reverse('home'), {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['books'][0].Title, 'Alpha')
+
+    def test_books_page_returns_fragment(self):
+        first = self.client.get(reverse('home'), {'page_size': 3})
+        response = self.client.get(reverse('books_page'), {'page_size': 3, 'cursor': first.context['next_cursor']})
+        data = response.json()
+        self.assertIn('Delta', data['html'])
+        self.assertNotIn('Alpha', data['html'])
+        self.assertIsNone(data['next_cursor'])
+
+
+class HomeQueryCountTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(FirstName='Anna', LastName='Author')
+        self.genre = Genre.objects.create(Name='Drama')
+        self.created = 0
+
+    def add_books(self, count, copies=3):
+        for _ in range(count):
+            book = Book.objects.create(
+                Title=f'Book {self.created}', ISBN=f'{self.created:013d}',
+                Author=self.author, Genre=self.genre
+            )
+            BookCopy.objects.bulk_create([BookCopy(Book=book) for _ in range(copies)])
+            self.created += 1
+
+    def count_home_queries(self):
+        self.client.get(reverse('home'))  # warm up the lookup caches
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_admin_home_query_count_is_constant(self):
+        log_in(self.client, create_account(role_id=2))
+
+        self.add_books(2)
+        small = self.count_home_queries()
+        self.add_books(10, copies=5)
+        large = self.count_home_queries()
+
+        self.assertEqual(small, large)
+
+    def test_user_home_query_count_is_constant(self):
+        log_in(self.client, create_account())
+
+        self.add_books(2)
+        small = self.count_home_queries()
+        self.add_books(10)
+        large = self.count_home_queries()
+
+        self.assertEqual(small, large)
+
+
+class CopyCounterTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        self.user = create_account()
+        log_in(self.client, self.admin)
+        self.client.post(reverse('add_book'), {
+            'title': 'Counted', 'isbn': '9780000000001',
+            'author': author.AuthorID, 'genre': genre.GenreID, 'num_copies': 3,
+        })
+        self.book = Book.objects.get(ISBN='9780000000001')
+
+    def assertCounts(self, **expected):
+        self.book.refresh_from_db()
+        for column, value in expected.items():
+            self.assertEqual(getattr(self.book, column), value, column)
+
+    def test_counters_follow_circulation(self):
+        self.assertCounts(TotalCopies=3, AvailableCopies=3)
+
+        log_in(self.client, self.user)
+        self.client.post(reverse('reserve_book', args=[self.book.BookID]))
+        self.assertCounts(AvailableCopies=2, ReservedCopies=1)
+
+        log_in(self.client, self.admin)
+        reservation = self.book.reservation_set.get()
+        self.client.post(reverse('issue_book', args=[reservation.ReservationID]), {'due_date': '2099-01-01'})
+        self.assertCounts(ReservedCopies=0, RentedCopies=1)
+
+        rental = Rental.objects.get()
+        self.assertEqual(rental.Reservation_id, reservation.ReservationID)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.Phase, 'Rented')
+
+        self.client.post(reverse('process_return', args=[rental.RentalID]))
+        self.assertCounts(AvailableCopies=3, RentedCopies=0)
+        reservation.refresh_from_db()
+        self.assertEqual((reservation.Status, reservation.Phase), ('Completed', 'Returned'))
+
+        copy = self.book.bookcopy_set.first()
+        self.client.post(reverse('edit_copy', args=[copy.CopyID]), {'status': 'Damaged'})
+        self.assertCounts(AvailableCopies=2, DamagedCopies=1)
+
+        self.client.post(reverse('add_copies', args=[self.book.BookID]), {'num_copies': 2})
+        self.assertCounts(TotalCopies=5, AvailableCopies=4, DamagedCopies=1)
+
+    def test_add_copies_appends_without_touching_existing_copies(self):
+        copy = self.book.bookcopy_set.order_by('Sequence').first()
+        rental = Rental.objects.create(
+            Copy=copy, User=self.user, ProcessedByUser=self.admin, DueDate=timezone.now()
+        )
+        before = list(self.book.bookcopy_set.order_by('Sequence').values_list('CopyID', 'Sequence'))
+        self.assertEqual([sequence for _, sequence in before], [1, 2, 3])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('add_copies', args=[self.book.BookID]), {'num_copies': 2})
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('DELETE')])
+
+        after = list(self.book.bookcopy_set.order_by('Sequence').values_list('CopyID', 'Sequence'))
+        self.assertEqual(after[:3], before)
+        self.assertEqual([sequence for _, sequence in after[3:]], [4, 5])
+        self.assertTrue(Rental.objects.filter(RentalID=rental.RentalID, Copy=copy).exists())
+        self.assertCounts(TotalCopies=5, AvailableCopies=5)
+
+    def test_cancel_and_phase_filter(self):
+        log_in(self.client, self.user)
+        self.client.post(reverse('reserve_book', args=[self.book.BookID]))
+        reservation = self.book.reservation_set.get()
+        self.client.post(reverse('cancel_reservation', args=[reservation.ReservationID]))
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.Phase, 'Cancelled')
+        self.assertCounts(AvailableCopies=3, ReservedCopies=0)
+
+        response = self.client.get(reverse('reservations'), {'phase': 'Cancelled'})
+        self.assertEqual(len(response.context['reservation_data']), 1)
+        response = self.client.get(reverse('reservations'), {'phase': 'Reserved'})
+        self.assertEqual(response.context['reservation_data'], [])
+
+    def test_availability_filter_uses_counters(self):
+        log_in(self.client, self.user)
+        response = self.client.get(reverse('home'), {'availability': 'unavailable'})
+        self.assertEqual(list(response.context['books']), [])
+
+    def test_reconcile_repairs_drift(self):
+        Book.objects.filter(BookID=self.book.BookID).update(AvailableCopies=7, LostCopies=1)
+
+        out = StringIO()
+        call_command('reconcile_book_counts', '--dry-run', stdout=out)
+        self.assertIn('AvailableCopies 7 -> 3', out.getvalue())
+        self.assertCounts(AvailableCopies=7)
+
+        call_command('reconcile_book_counts', stdout=StringIO())
+        self.assertCounts(AvailableCopies=3, LostCopies=0)
+
+
+class BookCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.book = Book.objects.create(
+            Title='Cached', ISBN='9780000000003', Author=self.author, Genre=genre,
+            TotalCopies=1, AvailableCopies=1
+        )
+        BookCopy.objects.create(Book=self.book)
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        self.user = create_account()
+        self.other = create_account(email='other@example.com', phone='20000002')
+
+    def home_html(self, account):
+        log_in(self.client, account)
+        return self.client.get(reverse('home')).content.decode()
+
+    def test_card_served_from_cache_until_the_book_changes(self):
+        self.assertIn('Cached', self.home_html(self.user))
+
+        # A write that bypasses the views doesn't bump the version, so the cached card stays
+        Book.objects.filter(pk=self.book.pk).update(Title='Changed behind our back')
+        self.assertIn('Cached', self.home_html(self.user))
+
+        log_in(self.client, self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_book', args=[self.book.BookID]), {
+                'title': 'Edited', 'isbn': self.book.ISBN,
+                'author': self.author.AuthorID, 'genre': self.book.Genre_id,
+            })
+        html = self.home_html(self.user)
+        self.assertIn('Edited', html)
+        self.assertNotIn('Cached', html)
+
+    def test_reservation_overlay_is_per_user(self):
+        self.home_html(self.other)  # warm the shared card
+
+        log_in(self.client, self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reserve_book', args=[self.book.BookID]))
+
+        self.assertIn('You: Reserved', self.home_html(self.user))
+        html = self.home_html(self.other)
+        self.assertNotIn('You: Reserved', html)
+        self.assertIn('0 available / 1 total', html)
+
+    def test_counter_changes_outside_the_views_show_up(self):
+        self.assertIn('1 available / 1 total', self.home_html(self.user))
+
+        # e.g. reconcile_book_counts or another worker process - no version bump
+        Book.objects.filter(pk=self.book.pk).update(AvailableCopies=0, TotalCopies=2)
+        html = self.home_html(self.user)
+        self.assertIn('0 available / 2 total', html)
+        self.assertIn('All Rented', html)
+
+
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Author.objects.create(FirstName='John', LastName='Tolkien')
+        Author.objects.create(FirstName='Joanne', LastName='Rowling')
+        Genre.objects.create(Name='Fantasy')
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        log_in(self.client, self.admin)
+
+    def test_author_autocomplete(self):
+        response = self.client.get(reverse('author_autocomplete'), {'q': 'jo'})
+        self.assertEqual([a['name'] for a in response.json()['results']], ['Joanne Rowling', 'John Tolkien'])
+
+        response = self.client.get(reverse('author_autocomplete'), {'q': 'john tol'})
+        self.assertEqual([a['name'] for a in response.json()['results']], ['John Tolkien'])
+
+    def test_home_does_not_embed_authors(self):
+        self.assertNotContains(self.client.get(reverse('home')), 'Rowling')
+
+    def test_lists_cached_until_changed(self):
+        self.client.get(reverse('add_book'))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('add_book'))
+        self.assertFalse([q for q in captured if 'Books_author' in q['sql'] or 'Books_genre' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('manage_genres'), {'action': 'add', 'name': 'Poetry'})
+        self.assertContains(self.client.get(reverse('add_book')), 'Poetry')
+
+
+class ReservationsPageTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        self.user = create_account()
+        now = timezone.now()
+        # Books 0-2 are out with different due dates, 3-4 were never issued
+        for i, due_days in enumerate([5, 1, 9, None, None]):
+            book = Book.objects.create(Title=f'Book {i}', ISBN=f'97800000001{i:02d}', Author=author, Genre=genre)
+            copy = BookCopy.objects.create(Book=book, Status='Reserved' if due_days is None else 'Rented')
+            reservation = Reservation.objects.create(
+                User=self.user, Book=book, ExpiryTime=now + timedelta(days=7),
+                Phase='Reserved' if due_days is None else 'Rented'
+            )
+            if due_days is not None:
+                Rental.objects.create(
+                    Copy=copy, User=self.user, ProcessedByUser=self.admin,
+                    DueDate=now + timedelta(days=due_days), Reservation=reservation
+                )
+        log_in(self.client, self.user)
+
+    def titles(self, **params):
+        response = self.client.get(reverse('reservations'), params)
+        return [item['reservation'].Book.Title for item in response.context['reservation_data']]
+
+    def test_due_date_sort_puts_unissued_last(self):
+        self.assertEqual(self.titles(sort='due_date')[:3], ['Book 1', 'Book 0', 'Book 2'])
+        self.assertEqual(self.titles(sort='-due_date')[:3], ['Book 2', 'Book 0', 'Book 1'])
+        self.assertEqual(sorted(self.titles(sort='due_date')[3:]), ['Book 3', 'Book 4'])
+
+    def test_pages_split_the_sorted_rows(self):
+        first = self.titles(sort='due_date', page_size=2)
+        second = self.titles(sort='due_date', page_size=2, page=2)
+        third = self.titles(sort='due_date', page_size=2, page=3)
+        self.assertEqual(first + second, ['Book 1', 'Book 0', 'Book 2'] + second[1:])
+        self.assertEqual(len(first + second + third), 5)
+        self.assertEqual(len(set(first + second + third)), 5)
+
+
+class BulkCirculationTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        self.reservations = []
+        for i in range(4):
+            book = Book.objects.create(
+                Title=f'Desk {i}', ISBN=f'97800000002{i:02d}', Author=author, Genre=genre,
+                TotalCopies=1, ReservedCopies=1
+            )
+            BookCopy.objects.create(Book=book, Status='Reserved')
+            self.reservations.append(Reservation.objects.create(
+                User=create_account(email=f'reader{i}@example.com', phone=f'2100000{i}'),
+                Book=book, ExpiryTime=timezone.now() + timedelta(days=7)
+            ))
+        log_in(self.client, self.admin)
+
+    def issue(self, *reservation_ids):
+        return self.client.post(
+            reverse('bulk_issue_books'),
+            {'reservation_ids': list(reservation_ids), 'due_date': '2099-01-01'},
+            content_type='application/json'
+        ).json()
+
+    def test_bulk_issue_reports_each_item(self):
+        first, second = self.reservations[0].ReservationID, self.reservations[1].ReservationID
+        data = self.issue(first, second, 999999, 'abc')
+
+        self.assertEqual((data['processed'], data['failed']), (2, 2))
+        outcomes = {str(result['id']): result['ok'] for result in data['results']}
+        self.assertEqual(outcomes, {str(first): True, str(second): True, '999999': False, 'abc': False})
+        self.assertEqual(Rental.objects.filter(Reservation__isnull=False).count(), 2)
+        book = self.reservations[0].Book
+        book.refresh_from_db()
+        self.assertEqual((book.ReservedCopies, book.RentedCopies), (0, 1))
+
+        # Issuing again is refused per item
+        self.assertEqual(self.issue(first)['results'][0]['message'], 'This book has already been issued.')
+
+    def test_bulk_issue_query_count_does_not_grow_per_item(self):
+        self.issue()  # warm up
+        with CaptureQueriesContext(connection) as one:
+            self.issue(self.reservations[0].ReservationID)
+        with CaptureQueriesContext(connection) as three:
+            self.issue(*[r.ReservationID for r in self.reservations[1:]])
+        self.assertEqual(len(one), len(three))
+
+    def test_bulk_return_by_scanned_copy(self):
+        self.issue(*[r.ReservationID for r in self.reservations])
+        copies = [r.Book.bookcopy_set.get().CopyID for r in self.reservations[:2]]
+
+        data = self.client.post(reverse('bulk_process_returns'), {'copy_ids': copies + [999999]}).json()
+        self.assertEqual((data['processed'], data['failed']), (2, 1))
+        self.assertEqual(Return.objects.count(), 2)
+
+        statuses = set(Reservation.objects.filter(
+            ReservationID__in=[r.ReservationID for r in self.reservations[:2]]
+        ).values_list('Status', 'Phase'))
+        self.assertEqual(statuses, {('Completed', 'Returned')})
+        book = self.reservations[0].Book
+        book.refresh_from_db()
+        self.assertEqual((book.AvailableCopies, book.RentedCopies), (1, 0))
+
+
+class ExpireReservationsTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.book = Book.objects.create(
+            Title='Waiting', ISBN='9780000000004', Author=author, Genre=genre,
+            TotalCopies=3, ReservedCopies=2, RentedCopies=1
+        )
+        for status in ('Reserved', 'Reserved', 'Rented'):
+            BookCopy.objects.create(Book=self.book, Status=status)
+        now = timezone.now()
+        self.stale = Reservation.objects.create(
+            User=create_account(), Book=self.book, ExpiryTime=now - timedelta(hours=1)
+        )
+        self.fresh = Reservation.objects.create(
+            User=create_account(email='b@example.com', phone='20000002'), Book=self.book,
+            ExpiryTime=now + timedelta(days=1)
+        )
+        # Past its expiry but already picked up - not the sweeper's business
+        self.rented = Reservation.objects.create(
+            User=create_account(email='c@example.com', phone='20000003'), Book=self.book,
+            ExpiryTime=now - timedelta(days=3), Phase='Rented'
+        )
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('expire_reservations', '--dry-run', stdout=out)
+        self.assertIn('1 reservations would expire', out.getvalue())
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.Status, 'Active')
+
+    def test_expires_stale_reservations_and_frees_copies(self):
+        out = StringIO()
+        call_command('expire_reservations', '--batch-size', 1, stdout=out)
+        self.assertIn('Expired 1 reservations', out.getvalue())
+
+        statuses = dict(Reservation.objects.values_list('ReservationID', 'Status'))
+        self.assertEqual(statuses, {
+            self.stale.ReservationID: 'Expired',
+            self.fresh.ReservationID: 'Active',
+            self.rented.ReservationID: 'Active',
+        })
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.AvailableCopies, self.book.ReservedCopies), (1, 1))
+        self.assertEqual(self.book.bookcopy_set.filter(Status='Available').count(), 1)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.admin = create_account(role_id=2)
+        tolkien = Author.objects.create(FirstName='John', LastName='Tolkien')
+        fantasy = Genre.objects.create(Name='Fantasy')
+        Book.objects.create(Title='The Hobbit', ISBN='9780261102217', Author=tolkien, Genre=fantasy)
+
+    def test_import_command_reads_csv(self):
+        rows = (
+            'Title,ISBN,Author,Genre,Publication_Date,Cover_URL,Copies\n'
+            'The Silmarillion,9780261102736,John Tolkien,fantasy,1977-09-15,,2\n'
+            'Dune,9780441172719,"Herbert, Frank",Science Fiction,,https://example.com/dune.jpg,3\n'
+            'The Hobbit again,9780261102217,John Tolkien,Fantasy,,,1\n'
+            'Children of Dune,9780441104024,Frank Herbert,Science Fiction,1976,,1\n'
+            'Dune duplicate,9780441172719,Frank Herbert,Science Fiction,,,1\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write(rows)
+        self.addCleanup(os.remove, f.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', f.name, '--batch-size', 1, stdout=out, stderr=err)
+        self.assertIn('Imported 2 books with 5 copies from 5 rows', out.getvalue())
+        self.assertIn('2 duplicate ISBNs skipped, 1 invalid rows', out.getvalue())
+        self.assertIn('line 5: Invalid publication date', err.getvalue())
+
+        # Existing author/genre reused case-insensitively, new ones created once
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 2)
+        dune = Book.objects.get(ISBN='9780441172719')
+        self.assertEqual((dune.Author.FirstName, dune.Author.LastName), ('Frank', 'Herbert'))
+        self.assertEqual((dune.TotalCopies, dune.AvailableCopies), (3, 3))
+        self.assertEqual(dune.bookcopy_set.filter(Status='Available').count(), 3)
+        self.assertEqual(Book.objects.get(ISBN='9780261102736').PublicationDate, date(1977, 9, 15))
+        # Imported books are searchable once the index is rebuilt
+        self.assertIn(dune.BookID, search_ids('Dune'))
+
+    def test_admin_upload_jsonl(self):
+        log_in(self.client, self.admin)
+        upload = SimpleUploadedFile('feed.jsonl', (
+            '{"title": "Beowulf", "isbn": 9780141194752, "author": "Unknown", "genre": "Poetry", "copies": 1}\n'
+            '\n'
+            'not json\n'
+            '{"title": "No copies", "isbn": "9780000000011", "author": "A B", "genre": "Poetry", "copies": 0}\n'
+        ).encode())
+        response = self.client.post(reverse('import_books'), {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result['counts']['books'], 2)
+        self.assertEqual(result['errors'], [(3, 'Not a valid JSON object.')])
+        beowulf = Book.objects.get(ISBN='9780141194752')
+        self.assertEqual((beowulf.Author.FirstName, beowulf.Author.LastName), ('', 'Unknown'))
+        self.assertEqual(Book.objects.get(ISBN='9780000000011').TotalCopies, 0)
+
+    def test_upload_requires_admin(self):
+        log_in(self.client, create_account(email='reader@example.com', phone='20000009'))
+        response = self.client.post(reverse('import_books'), {
+            'file': SimpleUploadedFile('feed.csv', b'title,isbn,author,genre\nX,1,A B,C\n')
+        })
+        self.assertNotEqual(response.status_code, 200)
+        self.assertFalse(Book.objects.filter(ISBN='1').exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = create_account(role_id=2)
+        self.reader = create_account(email='reader@example.com', phone='20000009')
+        author = Author.objects.create(FirstName='Frank', LastName='Herbert')
+        genre = Genre.objects.create(Name='Science Fiction')
+        self.book = Book.objects.create(
+            Title='Dune', ISBN='9780441172719', Author=author, Genre=genre,
+            TotalCopies=2, AvailableCopies=1, RentedCopies=1
+        )
+        copy = BookCopy.objects.create(Book=self.book, Status='Rented')
+        BookCopy.objects.create(Book=self.book, Status='Available')
+        now = timezone.now()
+        self.rented = Reservation.objects.create(
+            User=self.reader, Book=self.book, ExpiryTime=now, Phase='Rented'
+        )
+        self.rental = Rental.objects.create(
+            Copy=copy, User=self.reader, ProcessedByUser=self.admin,
+            DueDate=now - timedelta(days=3), Reservation=self.rented
+        )
+        self.cancelled = Reservation.objects.create(
+            User=self.admin, Book=self.book, ExpiryTime=now, Status='Cancelled', Phase='Cancelled'
+        )
+        call_command('refresh_overdue', stdout=StringIO())
+
+    def download(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_catalog_csv_matches_import_columns(self):
+        log_in(self.client, self.admin)
+        response, body = self.download('export_catalog')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="catalog-', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['author'], 'Frank Herbert')
+        self.assertEqual((rows[0]['copies'], rows[0]['available'], rows[0]['rented']), ('2', '1', '1'))
+        self.assertEqual(rows[0]['publication_date'], '')
+
+    def test_reservations_export_follows_page_filters(self):
+        log_in(self.client, self.admin)
+        _, body = self.download('export_reservations', format='jsonl', phase='Rented')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['reservation_id'] for row in rows], [self.rented.ReservationID])
+        self.assertEqual(rows[0]['copy_id'], self.rental.Copy_id)
+        self.assertEqual(rows[0]['due_date'], self.rental.DueDate.isoformat())
+        self.assertIsNone(rows[0]['returned_at'])
+
+        # Readers only get their own history
+        log_in(self.client, self.reader)
+        _, body = self.download('export_reservations', format='jsonl')
+        self.assertEqual([json.loads(line)['reservation_id'] for line in body.splitlines()],
+                         [self.rented.ReservationID])
+
+    async def test_async_export_streams_blocks(self):
+        log_in(self.client, self.admin)  # the session is a signed cookie, nothing to query
+        self.async_client.cookies = self.client.cookies
+
+        with mock.patch.object(exports, 'BUFFER_SIZE', 1):
+            response = await self.async_client.get(reverse('export_catalog'))
+            # An async iterator, which the ASGI handler sends block by block
+            self.assertTrue(response.is_async)
+            blocks = [block async for block in response.streaming_content]
+        self.assertEqual(len(blocks), 2)  # the header and the one book
+        rows = list(csv.DictReader(StringIO(b''.join(blocks).decode())))
+        self.assertEqual(rows[0]['title'], 'Dune')
+
+    def test_overdue_export_and_command(self):
+        log_in(self.client, self.reader)
+        self.assertEqual(self.client.get(reverse('export_overdue')).status_code, 302)
+
+        log_in(self.client, self.admin)
+        _, body = self.download('export_overdue', format='jsonl')
+        row = json.loads(body)
+        self.assertEqual((row['type'], row['rental_id'], row['days_overdue']), ('rental', self.rental.RentalID, 3))
+
+        out = StringIO()
+        call_command('export_data', 'reservations', '--chunk-size', 1, stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([int(row['reservation_id']) for row in rows],
+                         [self.cancelled.ReservationID, self.rented.ReservationID])
+
+
+class SyntheticLibraryTests(TestCase):
+    def test_seed_is_consistent_and_deterministic(self):
+        counts = seed_library(books=40, users=10, reservations=80, seed=7)
+        self.assertEqual(counts['books'], 40)
+        self.assertEqual(Reservation.objects.count(), 80)
+
+        out = StringIO()
+        call_command('reconcile_book_counts', '--dry-run', stdout=out)
+        self.assertIn('0 with drifted counters', out.getvalue())
+
+        # Every Reserved/Rented copy belongs to an active reservation
+        active = Reservation.objects.filter(Status='Active').count()
+        self.assertEqual(BookCopy.objects.filter(Status__in=['Reserved', 'Rented']).count(), active)
+        # ...and every rental is linked to the reservation it was issued for
+        self.assertFalse(Rental.objects.filter(Reservation__isnull=True).exists())
+        self.assertEqual(
+            Rental.objects.filter(return__isnull=True).count(),
+            Reservation.objects.filter(Phase='Rented').count()
+        )
+
+        titles = list(Book.objects.order_by('BookID').values_list('Title', flat=True))
+        Book.objects.all().delete()
+        seed_library(books=40, users=10, reservations=80, seed=7)
+        self.assertEqual(list(Book.objects.order_by('BookID').values_list('Title', flat=True)), titles)
+
+    def test_seed_library_command(self):
+        out = StringIO()
+        call_command('seed_library', '--books', 30, '--users', 5, '--batch-size', 7, stdout=out)
+        self.assertIn('30 books', out.getvalue())
+        self.assertEqual(Book.objects.count(), 30)
+        # The search index is rebuilt after the bulk load
+        self.assertTrue(search_ids(Book.objects.first().Title.split()[0]))
+
+
+class OverdueTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        self.book = Book.objects.create(
+            Title='Late', ISBN='9780000000002', Author=author, Genre=genre, TotalCopies=1, RentedCopies=1
+        )
+        self.copy = BookCopy.objects.create(Book=self.book, Status='Rented')
+        self.admin = create_account(email='admin@example.com', phone='20000001', role_id=2)
+        self.user = create_account()
+        self.now = timezone.now()
+        log_in(self.client, self.admin)
+
+    def reserve(self, days_ago, status='Completed'):
+        reservation = Reservation.objects.create(
+            User=self.user, Book=self.book, ExpiryTime=self.now, Status=status
+        )
+        Reservation.objects.filter(pk=reservation.pk).update(ReservationTime=self.now - timedelta(days=days_ago))
+        return reservation
+
+    def rent(self, days_ago, due_days_ago, reservation=None):
+        rental = Rental.objects.create(
+            Copy=self.copy, User=self.user, ProcessedByUser=self.admin,
+            DueDate=self.now - timedelta(days=due_days_ago), Reservation=reservation
+        )
+        Rental.objects.filter(pk=rental.pk).update(RentTime=self.now - timedelta(days=days_ago))
+        if reservation:
+            Reservation.objects.filter(pk=reservation.pk).update(Phase='Rented')
+        return rental
+
+    def overdue_page(self):
+        call_command('refresh_overdue', stdout=StringIO())
+        return self.client.get(reverse('overdue'))
+
+    def overdue_items(self):
+        response = self.overdue_page()
+        return [item for group in response.context['by_book'] for item in group['items']]
+
+    def test_rental_shows_its_linked_reservation(self):
+        self.reserve(days_ago=60)
+        expected = self.reserve(days_ago=30, status='Active')
+        self.reserve(days_ago=5)
+        self.rent(days_ago=29, due_days_ago=15, reservation=expected)
+
+        items = self.overdue_items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].Type, 'rental')
+        self.assertEqual(items[0].Reservation_id, expected.ReservationID)
+
+    def test_returned_rentals_are_not_overdue(self):
+        self.reserve(days_ago=30)
+        rental = self.rent(days_ago=29, due_days_ago=15)
+        Return.objects.create(Rental=rental, ProcessedByUser=self.admin)
+
+        self.assertEqual(self.overdue_items(), [])
+
+    def test_items_stay_listed_until_resolved(self):
+        reservation = self.reserve(days_ago=30, status='Active')
+        rental = self.rent(days_ago=29, due_days_ago=15, reservation=reservation)
+        self.assertEqual(len(self.overdue_items()), 1)
+
+        # Refreshing again doesn't duplicate the row
+        call_command('refresh_overdue', stdout=StringIO())
+        self.assertEqual(OverdueItem.objects.count(), 1)
+
+        # The return clears it straight away, without waiting for the next refresh
+        self.client.post(reverse('process_return', args=[rental.RentalID]))
+        response = self.client.get(reverse('overdue'))
+        self.assertEqual(response.context['total_overdue'], 0)
+
+    def test_changing_the_expiry_keeps_the_reservations_overdue_rental(self):
+        reservation = self.reserve(days_ago=30, status='Active')
+        rental = self.rent(days_ago=29, due_days_ago=15, reservation=reservation)
+        self.assertEqual(len(self.overdue_items()), 1)
+
+        self.client.post(reverse('update_reservation_dates', args=[reservation.ReservationID]), {
+            'action': 'update_expiry', 'expiry_time': (self.now + timedelta(days=1)).strftime('%Y-%m-%d'),
+        })
+        self.assertQuerySetEqual(
+            OverdueItem.objects.values_list('Type', 'Rental_id'), [('rental', rental.RentalID)]
+        )
+
+    def test_due_date_still_in_the_past_stays_listed(self):
+        reservation = self.reserve(days_ago=30, status='Active')
+        self.rent(days_ago=29, due_days_ago=15, reservation=reservation)
+        self.assertEqual(len(self.overdue_items()), 1)
+        url = reverse('update_reservation_dates', args=[reservation.ReservationID])
+
+        self.client.post(url, {
+            'action': 'update_due_date', 'due_date': (self.now - timedelta(days=2)).strftime('%Y-%m-%d'),
+        })
+        self.assertEqual(OverdueItem.objects.count(), 1)
+
+        self.client.post(url, {
+            'action': 'update_due_date', 'due_date': (self.now + timedelta(days=7)).strftime('%Y-%m-%d'),
+        })
+        self.assertEqual(OverdueItem.objects.count(), 0)
+
+    def test_group_counts_cover_rentals_and_expired_reservations(self):
+        other = create_account(email='other@example.com', phone='20000002')
+        Reservation.objects.create(
+            User=other, Book=self.book, ExpiryTime=self.now - timedelta(days=1), Status='Active'
+        )
+        self.rent(days_ago=20, due_days_ago=6)
+        returned = self.rent(days_ago=40, due_days_ago=26)
+        Return.objects.create(Rental=returned, ProcessedByUser=self.admin)
+
+        response = self.overdue_page()
+        self.assertEqual(response.context['total_overdue'], 2)
+        [book_group] = response.context['by_book']
+        self.assertEqual(book_group['count'], 2)
+        self.assertEqual(
+            sorted(group['count'] for group in response.context['by_user']), [1, 1]
+        )
+
+
+@override_settings(DATABASE_LOCK_RETRIES=2, DATABASE_LOCK_BACKOFF=0)
+class LockRetryTests(SimpleTestCase):
+    def setUp(self):
+        reset_lock_retry_stats()
+
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        def run():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'done'
+        return run, calls
+
+    def test_retries_until_the_lock_is_free(self):
+        run, calls = self.flaky(2)
+        with mock.patch('Books.locking.time.sleep'):
+            self.assertEqual(call_with_retry(run), 'done')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(lock_retry_stats(), {'retried': 2, 'gave_up': 0})
+
+    def test_gives_up_after_the_last_retry(self):
+        run, calls = self.flaky(5)
+        with mock.patch('Books.locking.time.sleep'), self.assertLogs('Books.locking', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                call_with_retry(run)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(lock_retry_stats()['gave_up'], 1)
+
+    def test_other_errors_are_not_retried(self):
+        run, calls = self.flaky(1, 'no such table: Books_book')
+        with self.assertRaises(OperationalError):
+            call_with_retry(run)
+        self.assertEqual(len(calls), 1)
+
+
+class SQLiteSetupTests(TestCase):
+    def test_connection_setup(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_wal_is_set_once_by_migrate(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = {**settings.DATABASES['default'], 'NAME': os.path.join(directory, 'db.sqlite3')}
+        wrapper = DatabaseWrapper(connections.configure_settings({'default': database})['default'], 'journal-test')
+        self.addCleanup(wrapper.close)
+
+        def journal_mode():
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                return cursor.fetchone()[0]
+
+        # Connecting with the configured PRAGMAs leaves the file alone...
+        self.assertEqual(journal_mode(), 'delete')
+        # ...and the post_migrate step switches it for good
+        set_wal_journal(wrapper)
+        wrapper.close()
+        self.assertEqual(journal_mode(), 'wal')
+
+    def test_no_retry_inside_an_outer_transaction(self):
+        # Repeating the inner part of a transaction would not redo the rest of it
+        calls = []
+
+        def run():
+            calls.append(1)
+            raise OperationalError('database is locked')
+        with self.assertRaises(OperationalError):
+            call_with_retry(run)
+        self.assertEqual(len(calls), 1)
+
+
+class GatherQueriesTests(TransactionTestCase):
+    """Outside a test transaction gather_queries really runs on worker threads"""
+
+    def setUp(self):
+        author = Author.objects.create(FirstName='Anna', LastName='Author')
+        genre = Genre.objects.create(Name='Drama')
+        for i in range(3):
+            Book.objects.create(Title=f'Book {i}', ISBN=f'97800000000{i}', Author=author, Genre=genre)
+        self.account = create_account()
+
+    async def test_queries_run_on_worker_connections_that_are_closed_afterwards(self):
+        used = []
+
+        def count_books():
+            used.append((threading.get_ident(), connections['default']))
+            return Book.objects.count()
+
+        def titles():
+            used.append((threading.get_ident(), connections['default']))
+            return list(Book.objects.order_by('Title').values_list('Title', flat=True))
+
+        # The in-memory test database ignores close(), so watch the calls instead
+        closed = []
+        close = DatabaseWrapper.close
+
+        def record_close(wrapper):
+            closed.append(wrapper)
+            close(wrapper)
+
+        with mock.patch.object(DatabaseWrapper, 'close', record_close):
+            count, names = await gather_queries(count_books, titles)
+        self.assertEqual(count, 3)
+        self.assertEqual(names, ['Book 0', 'Book 1', 'Book 2'])
+
+        self.assertNotIn(threading.get_ident(), [thread for thread, _ in used])
+        for _, worker_connection in used:
+            self.assertIsNot(worker_connection, await sync_to_async(lambda: connections['default'])())
+            self.assertIn(worker_connection, closed)
+
+    def test_benchmark_counts_worker_queries(self):
+        client = Client()
+        log_in(client, self.account)
+        client.get(reverse('home'))  # warms up the lookup caches
+
+        # Inside a transaction the same queries run one after another on this connection
+        with transaction.atomic(), CaptureQueriesContext(connection) as sequential:
+            self.assertEqual(client.get(reverse('home')).status_code, 200)
+        sequential_count = len(sequential)  # the next request resets the query log
+        self.assertGreater(sequential_count, 1)
+        self.assertEqual(measure(lambda: client.get(reverse('home')), 1)['queries'], sequential_count)
+
+
+# The benchmark's clients talk to 'localhost'
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], ALLOWED_HOSTS=['localhost', 'testserver'],
+)
+class BenchmarkLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()  # login throttling buckets
+        Account.objects.create(
+            FirstName='Test', LastName='User', Email='user@example.com',
+            Phone='20000000', Password=make_password('secret')
+        )
+
+    def test_repeated_logins_are_not_throttled(self):
+        # More runs than the login-account bucket holds
+        result = measure_login('user@example.com', 'secret', 7)
+        self.assertEqual(result['status'], 302)
+
+        # The raised rates only apply to the benchmark
+        client = Client()
+        for _ in range(5):
+            client.post(reverse('login'), {'email': 'user@example.com', 'password': 'wrong'})
+        response = client.post(reverse('login'), {'email': 'user@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
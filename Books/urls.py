@@ -3,11 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('books/page/', views.books_page, name='books_page'),
+    path('authors/autocomplete/', views.author_autocomplete, name='author_autocomplete'),
     path('reserve/<int:book_id>/', views.reserve_book, name='reserve_book'),
     path('cancel-reservation/<int:reservation_id>/', views.cancel_reservation, name='cancel_reservation'),
     
     # Admin book management
     path('add-book/', views.add_book, name='add_book'),
+    path('import-books/', views.import_books, name='import_books'),
+    path('export/catalog/', views.export_catalog, name='export_catalog'),
     path('edit-book/<int:book_id>/', views.edit_book, name='edit_book'),
     path('delete-book/<int:book_id>/', views.delete_book, name='delete_book'),
     path('add-copies/<int:book_id>/', views.add_copies, name='add_copies'),
@@ -21,7 +25,11 @@ urlpatterns = [
     
     path('issue-book/<int:reservation_id>/', views.issue_book, name='issue_book'),
     path('process-return/<int:rental_id>/', views.process_return, name='process_return'),
+    path('issue-books/', views.bulk_issue_books, name='bulk_issue_books'),
+    path('process-returns/', views.bulk_process_returns, name='bulk_process_returns'),
     path('delete-reservation/<int:reservation_id>/', views.delete_reservation, name='delete_reservation'),
     path('update-reservation-dates/<int:reservation_id>/', views.update_reservation_dates, name='update_reservation_dates'),
     path('overdue/', views.overdue, name='overdue'),
+    path('export/reservations/', views.export_reservations, name='export_reservations'),
+    path('export/overdue/', views.export_overdue, name='export_overdue'),
 ]
\ No newline at end of file
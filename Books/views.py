@@ -1,52 +1,61 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, QueryDict, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.contrib import messages
-from django.db.models import Q, Count, Case, When, IntegerField, Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db.models import Q, F, Prefetch, Count, OuterRef, Subquery
 from django.utils import timezone
 from django.db import transaction
+from django.views.decorators.http import require_POST
+from collections import Counter
 from datetime import timedelta, datetime
-from Books.models import Book, BookCopy, Author, Genre, Reservation, Rental, Return
+import io
+import json
+from Books.models import (
+    Book, BookCopy, Author, Genre, Reservation, Rental, Return, OverdueItem,
+    shift_copy_counts, shift_copy_counts_many,
+    author_choices, genre_choices,
+)
+from Books.overdue import clear_overdue_items
+from Books.catalog_import import detect_format, import_catalog, read_rows
+from Books import exports
 from Account.decorators import login_required, admin_required
+from Account.middleware import aget_account, ais_admin, is_admin as user_is_admin
+from Books import search
+from Books.catalog_cache import (
+    add_card_versions, card_cache_timeout, invalidate_book_cards, invalidate_catalog_cards,
+    invalidate_lookup,
+)
+from Books.pagination import get_page_size, keyset_page
+from Books.async_queries import gather_queries
+from Books.locking import retry_on_lock
 
+# Most authors the filter autocomplete returns for one query
+AUTHOR_AUTOCOMPLETE_LIMIT = 20
 
-@login_required
-def home(request):
-    """Display books with search and filter functionality"""
-    user_id = request.session.get('user_id')
-    from Account.models import Account
-    
-    try:
-        account = Account.objects.select_related('Role').get(UserID=user_id)
-        is_admin = account.Role.RoleID == 2 if account.Role else False
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
-    
+
+def _catalog_books(request, is_admin):
+    """One page of the filtered book listing, with the pagination links"""
     # Get search and filter parameters
     search_query = request.GET.get('search', '').strip()
     genre_filter = request.GET.get('genre', '')
     author_filter = request.GET.get('author', '')
     availability_filter = request.GET.get('availability', '')
+    cursor = request.GET.get('cursor', '')
+    page_size = get_page_size(request)
     
-    # Start with all books - use select_related to avoid N+1 queries
-    books = Book.objects.select_related('Author', 'Genre').annotate(
-        total_copies=Count('bookcopy'),
-        available_copies=Count(
-            Case(
-                When(bookcopy__Status='Available', then=1),
-                output_field=IntegerField()
-            )
-        )
-    )
+    # Start with all books - use select_related to avoid N+1 queries.
+    # Copy counts are stored on Book, so no GROUP BY over BookCopy is needed.
+    books = Book.objects.select_related('Author', 'Genre')
     
-    # Apply search filter
+    # Apply search filter - served from the full-text index, best matches first
+    order_fields = ('Title', 'BookID')
     if search_query:
-        books = books.filter(
-            Q(Title__icontains=search_query) |
-            Q(Author__FirstName__icontains=search_query) |
-            Q(Author__LastName__icontains=search_query) |
-            Q(ISBN__icontains=search_query) |
-            Q(Genre__Name__icontains=search_query)
-        )
+        books = search.filter_books(books, search_query)
+        if 'search_rank' in books.query.annotations:
+            order_fields = ('search_rank', 'BookID')
     
     # Apply author filter
     if author_filter:
@@ -56,110 +65,154 @@ def home(request):
     if genre_filter:
         books = books.filter(Genre__GenreID=genre_filter)
     
-    # Apply availability filter
+    # Apply availability filter (indexed column)
     if availability_filter == 'available':
-        books = books.filter(available_copies__gt=0)
+        books = books.filter(AvailableCopies__gt=0)
     elif availability_filter == 'unavailable':
-        books = books.filter(available_copies=0)
+        books = books.filter(AvailableCopies=0)
     
-    # Get all authors and genres for filter dropdowns (only load what we need)
-    all_authors = Author.objects.only('AuthorID', 'FirstName', 'LastName').order_by('LastName', 'FirstName')
-    genres = Genre.objects.only('GenreID', 'Name').order_by('Name')
+    # Admins see every physical copy - load them for the whole page in one query
+    if is_admin:
+        books = books.prefetch_related(
+            Prefetch('bookcopy_set', queryset=BookCopy.objects.order_by('Sequence'))
+        )
     
-    # Check user's active reservations and get their status
-    user_reservations = []
-    user_reservation_data = {}
-    if not is_admin:
-        # Get user's active reservations
-        user_reservations_qs = Reservation.objects.filter(
-            User=account,
-            Status='Active'
-        ).select_related('Book')
-        
-        user_reservations = [r.Book_id for r in user_reservations_qs]
-        
-        # Get all rentals for this user in one query
-        user_book_ids = [r.Book_id for r in user_reservations_qs]
-        if user_book_ids:
-            user_rentals = Rental.objects.filter(
-                User=account,
-                Copy__Book_id__in=user_book_ids
-            ).select_related('Copy', 'Copy__Book').prefetch_related(
-                Prefetch(
-                    'return_set',
-                    queryset=Return.objects.all()
-                )
-            )
-            
-            # Build a lookup map: book_id -> list of rentals
-            rentals_by_book = {}
-            for rental in user_rentals:
-                book_id = rental.Copy.Book_id
-                if book_id not in rentals_by_book:
-                    rentals_by_book[book_id] = []
-                rentals_by_book[book_id].append(rental)
-        else:
-            rentals_by_book = {}
-        
-        # Get detailed reservation data for the user
-        for reservation in user_reservations_qs:
-            # Find if this reservation has a rental
-            rental = None
-            book_rentals = rentals_by_book.get(reservation.Book_id, [])
-            for r in book_rentals:
-                if r.RentTime >= reservation.ReservationTime:
-                    rental = r
-                    break
-            
-            return_record = None
-            if rental:
-                # Already prefetched
-                return_records = list(rental.return_set.all())
-                return_record = return_records[0] if return_records else None
-            
-            # Determine phase
-            if return_record:
-                phase = 'Returned'
-            elif rental:
-                phase = 'Rented'
-            else:
-                phase = 'Reserved'
-            
-            user_reservation_data[reservation.Book.BookID] = {
-                'reservation': reservation,
-                'phase': phase,
-                'rental': rental,
-                'return_record': return_record,
-            }
+    # Only load one page - keyset pagination keeps deep pages as cheap as the first
+    books, next_cursor = keyset_page(books, order_fields, cursor, page_size)
     
-    context = {
+    # Card fragments are cached per book; the version changes whenever the book does
+    add_card_versions(books)
+    
+    # Query strings for the "Load More" / "Back to First Page" links (filters preserved)
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_query = params.urlencode()
+    next_query = ''
+    if next_cursor:
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+    
+    return {
         'books': books,
-        'all_authors': all_authors,
-        'genres': genres,
+        'next_cursor': next_cursor,
+        'next_query': next_query,
+        'first_query': first_query,
+        'is_first_page': not cursor,
+        'page_size': page_size,
+        'card_cache_timeout': card_cache_timeout(),
         'is_admin': is_admin,
         'search_query': search_query,
         'author_filter': author_filter,
         'genre_filter': genre_filter,
         'availability_filter': availability_filter,
+    }
+
+
+def _user_reservations(account):
+    """The user's active reservations, as the book cards show them"""
+    user_reservations = []
+    user_reservation_data = {}
+    # Phase and the issued rental are stored on the reservation - no matching needed
+    user_reservations_qs = Reservation.objects.filter(
+        User=account,
+        Status='Active'
+    ).prefetch_related(
+        Prefetch('rental_set', queryset=Rental.objects.select_related('Copy'), to_attr='linked_rentals')
+    )
+    
+    for reservation in user_reservations_qs:
+        user_reservations.append(reservation.Book_id)
+        user_reservation_data[reservation.Book_id] = {
+            'reservation': reservation,
+            'phase': reservation.Phase,
+            'rental': reservation.linked_rentals[0] if reservation.linked_rentals else None,
+        }
+    return {
         'user_reservations': user_reservations,
         'user_reservation_data': user_reservation_data,
     }
+
+
+def _catalog_context(request, account, is_admin):
+    """Filtered, paginated book listing shared by the home page and its scroll endpoint"""
+    context = _catalog_books(request, is_admin)
+    # Admins don't reserve, so they have no reservations to overlay
+    context.update(_user_reservations(account) if not is_admin else {
+        'user_reservations': [], 'user_reservation_data': {},
+    })
+    return context
+
+
+def _selected_author(author_filter):
+    if author_filter.isdigit():
+        return Author.objects.filter(AuthorID=author_filter).first()
+    return None
+
+
+@login_required
+async def home(request):
+    """Display books with search and filter functionality"""
+    account = await aget_account(request)
+    is_admin = await ais_admin(request)
+    
+    # The book page, the user's reservations, the genres and the selected author
+    # don't depend on each other - fetch them at the same time.
+    # Genres are few and cached; authors are looked up on demand by the autocomplete,
+    # so only the currently selected one is needed to prefill the filter
+    context, user_reservations, genres, selected_author = await gather_queries(
+        lambda: _catalog_books(request, is_admin),
+        lambda: _user_reservations(account) if not is_admin else {
+            'user_reservations': [], 'user_reservation_data': {},
+        },
+        genre_choices,
+        lambda: _selected_author(request.GET.get('author', '')),
+    )
+    context.update(user_reservations)
+    context['genres'] = genres
+    context['selected_author'] = selected_author
     
-    return render(request, 'home.html', context)
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+@login_required
+def author_autocomplete(request):
+    """JSON endpoint for the author filter - authors whose first or last name starts with the typed words"""
+    words = request.GET.get('q', '').split()
+    if not words:
+        return JsonResponse({'results': []})
+    
+    authors = Author.objects.all()
+    for word in words:
+        authors = authors.filter(Q(FirstName__istartswith=word) | Q(LastName__istartswith=word))
+    authors = authors.order_by('LastName', 'FirstName')[:AUTHOR_AUTOCOMPLETE_LIMIT]
+    
+    return JsonResponse({
+        'results': [
+            {'id': author.AuthorID, 'name': f'{author.FirstName} {author.LastName}'}
+            for author in authors
+        ]
+    })
+
+
+@login_required
+def books_page(request):
+    """JSON endpoint for infinite scroll - returns the next page of book cards as HTML"""
+    context = _catalog_context(request, request.account, user_is_admin(request))
+    html = render_to_string('book_cards.html', context, request=request)
+    
+    return JsonResponse({
+        'html': html,
+        'next_cursor': context['next_cursor'],
+        'next_query': context['next_query'],
+    })
 
 
 @login_required
+@retry_on_lock
 @transaction.atomic
 def reserve_book(request, book_id):
     """Handle book reservation for users"""
-    user_id = request.session.get('user_id')
-    from Account.models import Account
-    
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
+    account = request.account
     
     book = get_object_or_404(Book, BookID=book_id)
     
@@ -199,38 +252,40 @@ def reserve_book(request, book_id):
     # Mark the copy as Reserved (within the same transaction)
     available_copy.Status = 'Reserved'
     available_copy.save()
+    shift_copy_counts(book.BookID, 'Available', 'Reserved')
+    invalidate_book_cards(book.BookID)
     
     messages.success(request, f'Successfully reserved "{book.Title}"!')
     return redirect('home')
 
 
 @login_required
+@retry_on_lock
 @transaction.atomic
 def cancel_reservation(request, reservation_id):
     """Cancel a reservation"""
-    user_id = request.session.get('user_id')
-    from Account.models import Account
-    
-    try:
-        account = Account.objects.get(UserID=user_id)
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
+    account = request.account
     
     reservation = get_object_or_404(Reservation, ReservationID=reservation_id, User=account)
     
-    # Use select_for_update to prevent race conditions
-    reserved_copy = BookCopy.objects.select_for_update().filter(
-        Book=reservation.Book, 
-        Status='Reserved'
-    ).first()
-    
-    if reserved_copy:
-        reserved_copy.Status = 'Available'
-        reserved_copy.save()
+    # Only a reservation that hasn't been issued yet is holding a Reserved copy
+    if reservation.Phase == 'Reserved':
+        # Use select_for_update to prevent race conditions
+        reserved_copy = BookCopy.objects.select_for_update().filter(
+            Book=reservation.Book, 
+            Status='Reserved'
+        ).first()
+        
+        if reserved_copy:
+            reserved_copy.Status = 'Available'
+            reserved_copy.save()
+            shift_copy_counts(reserved_copy.Book_id, 'Reserved', 'Available')
+            invalidate_book_cards(reserved_copy.Book_id)
     
     reservation.Status = 'Cancelled'
+    reservation.Phase = 'Cancelled'
     reservation.save()
+    clear_overdue_items(reservation_id=reservation.ReservationID)
     
     messages.success(request, 'Reservation cancelled successfully.')
     return redirect('home')
@@ -288,15 +343,16 @@ def add_book(request):
                     # Create book copies - use bulk_create for better performance
                     copies = [BookCopy(Book=book, Status='Available') for _ in range(num_copies)]
                     BookCopy.objects.bulk_create(copies)
+                    shift_copy_counts(book.BookID, None, 'Available', num_copies)
                 
                 messages.success(request, f'Successfully added "{title}" with {num_copies} cop{"y" if num_copies == 1 else "ies"}!')
                 return redirect('home')
             except Exception as e:
                 errors['general'] = f'An error occurred: {str(e)}'
     
-    # Get authors and genres for dropdowns (only load what we need)
-    authors = Author.objects.only('AuthorID', 'FirstName', 'LastName').order_by('LastName', 'FirstName')
-    genres = Genre.objects.only('GenreID', 'Name').order_by('Name')
+    # Get authors and genres for dropdowns (cached, see Books/catalog_cache.py)
+    authors = author_choices()
+    genres = genre_choices()
     
     context = {
         'authors': authors,
@@ -308,6 +364,37 @@ def add_book(request):
     return render(request, 'add_book.html', context)
 
 
+@admin_required
+def import_books(request):
+    """Admin page to import a CSV or JSON Lines file of books"""
+    result = None
+    error = None
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        fmt = request.POST.get('format') or (detect_format(upload.name) if upload else None)
+        if not upload:
+            error = 'Choose a file to import.'
+        elif fmt not in ('csv', 'jsonl'):
+            error = 'Unsupported file type - upload a .csv or .jsonl file.'
+        else:
+            # Large uploads are spooled to a temporary file by Django, and the
+            # rows are read from it one at a time
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                counts, errors = import_catalog(read_rows(stream, fmt))
+            except UnicodeDecodeError:
+                error = 'The file is not UTF-8 encoded.'
+            except Exception as e:
+                error = f'An error occurred: {str(e)}'
+            else:
+                result = {'counts': counts, 'errors': errors, 'more_errors': counts['invalid'] - len(errors)}
+            finally:
+                stream.detach()
+
+    return render(request, 'import_books.html', {'result': result, 'error': error})
+
+
 @admin_required
 def edit_book(request, book_id):
     """Admin page to edit a book"""
@@ -343,42 +430,35 @@ def edit_book(request, book_id):
                 book.PublicationDate = publication_date if publication_date else None
                 book.CoverImageURL = cover_url if cover_url else None
                 book.save()
+                invalidate_book_cards(book.BookID)
                 
                 messages.success(request, f'Successfully updated "{title}"!')
                 return redirect('home')
             except Exception as e:
                 errors['general'] = f'An error occurred: {str(e)}'
     
-    authors = Author.objects.only('AuthorID', 'FirstName', 'LastName').order_by('LastName', 'FirstName')
-    genres = Genre.objects.only('GenreID', 'Name').order_by('Name')
-    
-    # Calculate copy statistics - use aggregate for better performance
-    copy_stats = book.bookcopy_set.aggregate(
-        total=Count('CopyID'),
-        available=Count(Case(When(Status='Available', then=1), output_field=IntegerField())),
-        reserved=Count(Case(When(Status='Reserved', then=1), output_field=IntegerField())),
-        rented=Count(Case(When(Status='Rented', then=1), output_field=IntegerField())),
-        damaged=Count(Case(When(Status='Damaged', then=1), output_field=IntegerField())),
-        lost=Count(Case(When(Status='Lost', then=1), output_field=IntegerField())),
-    )
+    authors = author_choices()
+    genres = genre_choices()
     
+    # Copy statistics come from the counters stored on the book
     context = {
         'book': book,
         'authors': authors,
         'genres': genres,
         'errors': locals().get('errors', {}),
-        'total_copies': copy_stats['total'],
-        'available_copies': copy_stats['available'],
-        'reserved_copies': copy_stats['reserved'],
-        'rented_copies': copy_stats['rented'],
-        'damaged_copies': copy_stats['damaged'],
-        'lost_copies': copy_stats['lost'],
+        'total_copies': book.TotalCopies,
+        'available_copies': book.AvailableCopies,
+        'reserved_copies': book.ReservedCopies,
+        'rented_copies': book.RentedCopies,
+        'damaged_copies': book.DamagedCopies,
+        'lost_copies': book.LostCopies,
     }
     
     return render(request, 'edit_book.html', context)
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def delete_book(request, book_id):
     """Admin endpoint to delete a book"""
@@ -387,6 +467,7 @@ def delete_book(request, book_id):
     
     try:
         book.delete()
+        invalidate_book_cards(book_id)
         messages.success(request, f'Successfully deleted "{book_title}".')
     except Exception as e:
         messages.error(request, f'Could not delete book: {str(e)}')
@@ -395,9 +476,10 @@ def delete_book(request, book_id):
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def add_copies(request, book_id):
-    """Admin endpoint to add more copies of a book and renumber all copies"""
+    """Admin endpoint to add more copies of a book"""
     book = get_object_or_404(Book, BookID=book_id)
     
     if request.method == 'POST':
@@ -407,21 +489,18 @@ def add_copies(request, book_id):
                 messages.error(request, 'Number of copies must be between 1 and 10.')
                 return redirect('edit_book', book_id=book_id)
             
-            # Get all existing copies with their current state
-            existing_copies = list(BookCopy.objects.filter(Book=book).order_by('CopyID'))
-            copy_data = [{'status': copy.Status} for copy in existing_copies]
-            
-            # Add data for new copies
-            copy_data.extend([{'status': 'Available'} for _ in range(num_copies)])
-            
-            # Delete all existing copies
-            BookCopy.objects.filter(Book=book).delete()
-            
-            # Recreate all copies in order - use bulk_create for performance
-            new_copies = [BookCopy(Book=book, Status=data['status']) for data in copy_data]
-            BookCopy.objects.bulk_create(new_copies)
+            # Only the new copies are inserted, numbered after the existing
+            # ones - those keep their rows and their rental history
+            with transaction.atomic():
+                new_copies = BookCopy.objects.bulk_create(
+                    [BookCopy(Book=book, Status='Available') for _ in range(num_copies)]
+                )
+                shift_copy_counts(book.BookID, None, 'Available', num_copies)
+            invalidate_book_cards(book.BookID)
             
-            messages.success(request, f'Successfully added {num_copies} cop{"y" if num_copies == 1 else "ies"} of "{book.Title}" and renumbered all copies.')
+            first, last = new_copies[0].Sequence, new_copies[-1].Sequence
+            numbers = f'#{first}' if first == last else f'#{first}-#{last}'
+            messages.success(request, f'Successfully added {num_copies} cop{"y" if num_copies == 1 else "ies"} ({numbers}) of "{book.Title}".')
         except ValueError:
             messages.error(request, 'Invalid number of copies.')
         except Exception as e:
@@ -431,18 +510,22 @@ def add_copies(request, book_id):
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def edit_copy(request, copy_id):
     """Admin endpoint to update a book copy's status"""
-    copy = get_object_or_404(BookCopy, CopyID=copy_id)
+    copy = get_object_or_404(BookCopy.objects.select_for_update(), CopyID=copy_id)
     
     if request.method == 'POST':
         new_status = request.POST.get('status')
         # Only allow Available, Damaged, and Lost statuses
         # Reserved and Rented are managed through reservations and rentals
         if new_status in ['Available', 'Damaged', 'Lost']:
+            old_status = copy.Status
             copy.Status = new_status
             copy.save()
+            shift_copy_counts(copy.Book_id, old_status, new_status)
+            invalidate_book_cards(copy.Book_id)
             messages.success(request, f'Copy status updated to "{new_status}".')
         else:
             messages.error(request, 'Invalid status.')
@@ -462,6 +545,7 @@ def manage_authors(request):
             
             if first_name and last_name:
                 Author.objects.create(FirstName=first_name, LastName=last_name)
+                invalidate_lookup('authors')
                 messages.success(request, f'Successfully added author "{first_name} {last_name}".')
             else:
                 messages.error(request, 'Both first name and last name are required.')
@@ -477,6 +561,8 @@ def manage_authors(request):
                     author.FirstName = first_name
                     author.LastName = last_name
                     author.save()
+                    invalidate_lookup('authors')
+                    invalidate_catalog_cards()
                     messages.success(request, f'Successfully updated author to "{first_name} {last_name}".')
                 except Author.DoesNotExist:
                     messages.error(request, 'Author not found.')
@@ -490,6 +576,8 @@ def manage_authors(request):
                     author = Author.objects.get(AuthorID=author_id)
                     author_name = f"{author.FirstName} {author.LastName}"
                     author.delete()
+                    invalidate_lookup('authors')
+                    invalidate_catalog_cards()
                     messages.success(request, f'Successfully deleted author "{author_name}".')
                 except Author.DoesNotExist:
                     messages.error(request, 'Author not found.')
@@ -517,6 +605,7 @@ def manage_genres(request):
                     messages.error(request, f'Genre "{name}" already exists.')
                 else:
                     Genre.objects.create(Name=name)
+                    invalidate_lookup('genres')
                     messages.success(request, f'Successfully added genre "{name}".')
             else:
                 messages.error(request, 'Genre name is required.')
@@ -533,6 +622,8 @@ def manage_genres(request):
                     else:
                         genre.Name = name
                         genre.save()
+                        invalidate_lookup('genres')
+                        invalidate_catalog_cards()
                         messages.success(request, f'Successfully updated genre to "{name}".')
                 except Genre.DoesNotExist:
                     messages.error(request, 'Genre not found.')
@@ -546,6 +637,7 @@ def manage_genres(request):
                     genre = Genre.objects.get(GenreID=genre_id)
                     genre_name = genre.Name
                     genre.delete()
+                    invalidate_lookup('genres')
                     messages.success(request, f'Successfully deleted genre "{genre_name}".')
                 except Genre.DoesNotExist:
                     messages.error(request, 'Genre not found.')
@@ -559,18 +651,12 @@ def manage_genres(request):
     return render(request, 'manage_genres.html', context)
 
 
-@login_required
-def reservations(request):
-    """Unified page for viewing reservations - shows user's own or all (admin)"""
-    user_id = request.session.get('user_id')
-    from Account.models import Account
-    
-    try:
-        account = Account.objects.select_related('Role').get(UserID=user_id)
-        is_admin = account.Role.RoleID == 2 if account.Role else False
-    except Account.DoesNotExist:
-        request.session.flush()
-        return redirect('login')
+def _filtered_reservations(request, is_admin):
+    """
+    The reservations the reservations page shows for the current filters and
+    sort, ordered in the database. Returns (queryset, filters).
+    """
+    account = request.account
     
     # Get search and filter parameters
     search_query = request.GET.get('search', '').strip()
@@ -615,67 +701,82 @@ def reservations(request):
         if status_filter:
             reservations = reservations.filter(Status=status_filter)
     
-    # Apply sorting (before building phase data)
-    if sort_by == 'title':
-        reservations = reservations.order_by('Book__Title')
-    elif sort_by == '-title':
-        reservations = reservations.order_by('-Book__Title')
-    elif sort_by == 'reservation_time':
-        reservations = reservations.order_by('ReservationTime')
-    elif sort_by == '-reservation_time':
-        reservations = reservations.order_by('-ReservationTime')
-    elif sort_by == 'expiry_time':
-        reservations = reservations.order_by('ExpiryTime')
-    elif sort_by == '-expiry_time':
-        reservations = reservations.order_by('-ExpiryTime')
-    else:
-        reservations = reservations.order_by('-ReservationTime')
-    
-    # Fetch all the reservations into a list first
-    reservations_list = list(reservations)
-    
-    # Collect all the user IDs and book IDs from the reservations
-    user_ids = set()
-    book_ids = set()
-    for res in reservations_list:
-        user_ids.add(res.User_id)
-        book_ids.add(res.Book_id)
-    
-    # Fetch all rentals for these users and books in one query
-    if user_ids and book_ids:
-        all_rentals = Rental.objects.filter(
-            User_id__in=user_ids,
-            Copy__Book_id__in=book_ids
-        ).select_related('Copy', 'Copy__Book').prefetch_related(
-            Prefetch(
-                'return_set',
-                queryset=Return.objects.all()
-            )
+    # Apply phase filter (stored on the reservation, so the database does it)
+    if phase_filter:
+        reservations = reservations.filter(Phase=phase_filter)
+    
+    # Apply sorting in the database. Due dates come from the linked rental;
+    # reservations that were never issued sort last either way.
+    if sort_by in ('due_date', '-due_date'):
+        reservations = reservations.annotate(
+            due_date=Subquery(Rental.objects.filter(Reservation=OuterRef('pk')).values('DueDate')[:1])
         )
-        
-        # Build a lookup: (user_id, book_id) -> list of rentals
-        rentals_lookup = {}
-        for rental in all_rentals:
-            key = (rental.User_id, rental.Copy.Book_id)
-            if key not in rentals_lookup:
-                rentals_lookup[key] = []
-            rentals_lookup[key].append(rental)
+    orderings = {
+        'title': ['Book__Title'],
+        '-title': ['-Book__Title'],
+        'reservation_time': ['ReservationTime'],
+        '-reservation_time': ['-ReservationTime'],
+        'expiry_time': ['ExpiryTime'],
+        '-expiry_time': ['-ExpiryTime'],
+        'due_date': [F('due_date').asc(nulls_last=True), '-ReservationTime'],
+        '-due_date': [F('due_date').desc(nulls_last=True), '-ReservationTime'],
+    }
+    # ReservationID last so every row has a fixed place across pages
+    reservations = reservations.order_by(*orderings.get(sort_by, ['-ReservationTime']), '-ReservationID')
+    
+    filters = {
+        'search_query': search_query,
+        'status_filter': status_filter,
+        'phase_filter': phase_filter,
+        'sort_by': sort_by,
+    }
+    return reservations, filters
+
+
+def _page_number(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+@login_required
+async def reservations(request):
+    """Unified page for viewing reservations - shows user's own or all (admin)"""
+    await aget_account(request)  # request.account is used to filter a user's own reservations
+    is_admin = await ais_admin(request)
+    reservations, filters = _filtered_reservations(request, is_admin)
+    
+    # Load each reservation's rental (and its return) through the stored link
+    reservations = reservations.prefetch_related(
+        Prefetch(
+            'rental_set',
+            queryset=Rental.objects.select_related('Copy').prefetch_related('return_set'),
+            to_attr='linked_rentals'
+        )
+    )
+    
+    # Only the current page is fetched, at the same time as the total count
+    paginator = Paginator(reservations, get_page_size(request))
+    number = _page_number(request.GET.get('page'))
+    start = (number - 1) * paginator.per_page
+    paginator.count, rows = await gather_queries(
+        reservations.count,
+        lambda: list(reservations[start:start + paginator.per_page]),
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    if page.number == number:
+        page.object_list = rows
     else:
-        rentals_lookup = {}
+        # Page number past the end - get_page fell back to the last page
+        page.object_list = await sync_to_async(list)(page.object_list)
     
     # Build reservation data with phase information
     reservation_data = []
     now = timezone.now()
     
-    for reservation in reservations_list:
-        # Find if this reservation has a rental (from our lookup - no query!)
-        rental = None
-        key = (reservation.User_id, reservation.Book_id)
-        candidate_rentals = rentals_lookup.get(key, [])
-        for r in candidate_rentals:
-            if r.RentTime >= reservation.ReservationTime:
-                rental = r
-                break
+    for reservation in page:
+        rental = reservation.linked_rentals[0] if reservation.linked_rentals else None
         
         return_record = None
         if rental:
@@ -683,55 +784,36 @@ def reservations(request):
             return_records = list(rental.return_set.all())
             return_record = return_records[0] if return_records else None
         
-        # Determine phase
-        if reservation.Status == 'Cancelled':
-            phase = 'Cancelled'
-        elif return_record:
-            phase = 'Returned'
-        elif rental:
-            phase = 'Rented'
-        else:
-            phase = 'Reserved'
-        
         reservation_data.append({
             'reservation': reservation,
             'rental': rental,
             'return_record': return_record,
-            'phase': phase,
-            'is_overdue': rental and not return_record and now > rental.DueDate if rental else False,
+            'phase': reservation.Phase,
+            'is_overdue': reservation.Phase == 'Rented' and now > rental.DueDate if rental else False,
             'is_expired': reservation.Status == 'Active' and now > reservation.ExpiryTime,
         })
     
-    # Apply phase filter (after building phase data)
-    if phase_filter:
-        reservation_data = [item for item in reservation_data if item['phase'] == phase_filter]
-    
-    # Apply due date sorting if requested (only for items with rentals)
-    if sort_by == 'due_date':
-        reservation_data.sort(key=lambda x: x['rental'].DueDate if x['rental'] else now + timedelta(days=365))
-    elif sort_by == '-due_date':
-        reservation_data.sort(key=lambda x: x['rental'].DueDate if x['rental'] else now - timedelta(days=365), reverse=True)
+    # Filters and sort carried over to the page links
+    params = request.GET.copy()
+    params.pop('page', None)
     
     context = {
         'reservation_data': reservation_data,
         'is_admin': is_admin,
-        'search_query': search_query,
-        'status_filter': status_filter,
-        'phase_filter': phase_filter,
-        'sort_by': sort_by,
+        **filters,
+        'page_obj': page,
+        'page_query': params.urlencode(),
     }
     
-    return render(request, 'reservations.html', context)
+    return await sync_to_async(render)(request, 'reservations.html', context)
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def issue_book(request, reservation_id):
     """Admin action to issue a book (move from Reserved to Rented phase)"""
-    from Account.models import Account
-    
-    user_id = request.session.get('user_id')
-    admin = get_object_or_404(Account, UserID=user_id)
+    admin = request.account
     
     reservation = get_object_or_404(Reservation.objects.select_related('User', 'Book'), ReservationID=reservation_id)
     
@@ -739,15 +821,8 @@ def issue_book(request, reservation_id):
         messages.error(request, 'This reservation is not active.')
         return redirect('reservations')
     
-    # Check if already rented - use exists() for better performance
-    existing_rental = Rental.objects.filter(
-        User=reservation.User,
-        Copy__Book=reservation.Book
-    ).exclude(
-        return__isnull=False
-    ).exists()
-    
-    if existing_rental:
+    # Check if already rented
+    if reservation.Phase != 'Reserved':
         messages.warning(request, 'This book has already been issued.')
         return redirect('reservations')
     
@@ -778,17 +853,23 @@ def issue_book(request, reservation_id):
                 messages.error(request, 'Due date must be in the future.')
                 return redirect('reservations')
             
-            # Create rental
+            # Create rental, linked to the reservation it fulfils
             Rental.objects.create(
                 Copy=reserved_copy,
                 User=reservation.User,
                 ProcessedByUser=admin,
-                DueDate=due_date
+                DueDate=due_date,
+                Reservation=reservation
             )
+            reservation.Phase = 'Rented'
+            reservation.save(update_fields=['Phase'])
+            clear_overdue_items(reservation_id=reservation.ReservationID)
             
             # Update copy status
             reserved_copy.Status = 'Rented'
             reserved_copy.save()
+            shift_copy_counts(reserved_copy.Book_id, 'Reserved', 'Rented')
+            invalidate_book_cards(reserved_copy.Book_id)
             
             messages.success(request, f'Successfully issued "{reservation.Book.Title}" to {reservation.User.FirstName} {reservation.User.LastName}.')
             return redirect('reservations')
@@ -809,15 +890,15 @@ def issue_book(request, reservation_id):
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def process_return(request, rental_id):
     """Admin action to process a book return"""
-    from Account.models import Account
+    admin = request.account
     
-    user_id = request.session.get('user_id')
-    admin = get_object_or_404(Account, UserID=user_id)
-    
-    rental = get_object_or_404(Rental.objects.select_related('Copy', 'Copy__Book', 'User'), RentalID=rental_id)
+    rental = get_object_or_404(
+        Rental.objects.select_related('Copy', 'Copy__Book', 'User', 'Reservation'), RentalID=rental_id
+    )
     
     # Check if already returned - use exists() for better performance
     if Return.objects.filter(Rental=rental).exists():
@@ -829,55 +910,234 @@ def process_return(request, rental_id):
         Rental=rental,
         ProcessedByUser=admin
     )
+    clear_overdue_items(rental_id=rental.RentalID)
     
     # Update copy status back to Available
+    old_status = rental.Copy.Status
     rental.Copy.Status = 'Available'
     rental.Copy.save()
+    shift_copy_counts(rental.Copy.Book_id, old_status, 'Available')
+    invalidate_book_cards(rental.Copy.Book_id)
     
-    # Mark the reservation as completed so user can reserve again
-    # Find the reservation that led to this rental (created before the rental)
-    reservation = Reservation.objects.filter(
-        User=rental.User,
-        Book=rental.Copy.Book,
-        Status='Active',
-        ReservationTime__lte=rental.RentTime  # Only get reservations made before/at rental time
-    ).order_by('-ReservationTime').first()  # Get the most recent one before rental
-    
+    # Mark the reservation that led to this rental as completed so user can reserve again
+    reservation = rental.Reservation
     if reservation:
         reservation.Status = 'Completed'
-        reservation.save()
+        reservation.Phase = 'Returned'
+        reservation.save(update_fields=['Status', 'Phase'])
     
     messages.success(request, f'Successfully processed return for "{rental.Copy.Book.Title}".')
     return redirect('reservations')
 
 
+def _bulk_payload(request):
+    """The posted data of a bulk endpoint - a JSON object body, or ordinary form fields"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+def _posted_ids(data, field):
+    """
+    IDs from {"field": [1, 2]} or repeated form fields (field=1&field=2).
+    Returns (ids, invalid) - unique ints in the order given, and the values that weren't numbers.
+    """
+    if isinstance(data, QueryDict):
+        values = data.getlist(field)
+    else:
+        values = data.get(field, [])
+        if not isinstance(values, list):
+            values = [values]
+
+    ids = []
+    invalid = []
+    for value in values:
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            invalid.append(value)
+            continue
+        if value not in ids:
+            ids.append(value)
+    return ids, invalid
+
+
+def _bulk_response(results):
+    processed = sum(1 for result in results if result['ok'])
+    return JsonResponse({
+        'processed': processed,
+        'failed': len(results) - processed,
+        'results': results,
+    })
+
+
+@require_POST
+@admin_required
+@retry_on_lock
+@transaction.atomic
+def bulk_issue_books(request):
+    """
+    Circulation desk: issue many reservations in one transaction.
+    Takes reservation_ids and a due_date (YYYY-MM-DD), reports the outcome per reservation.
+    """
+    admin = request.account
+    data = _bulk_payload(request)
+    reservation_ids, invalid = _posted_ids(data, 'reservation_ids')
+    results = [{'id': value, 'ok': False, 'message': 'Invalid reservation ID.'} for value in invalid]
+    
+    try:
+        due_date = datetime.strptime(str(data.get('due_date') or ''), '%Y-%m-%d')
+        due_date = timezone.make_aware(due_date.replace(hour=23, minute=59, second=59))
+    except ValueError:
+        return JsonResponse({'error': 'A due_date in YYYY-MM-DD format is required.'}, status=400)
+    if due_date <= timezone.now():
+        return JsonResponse({'error': 'Due date must be in the future.'}, status=400)
+    
+    # Lock all the reservations and the reserved copies of their books up front
+    reservations = Reservation.objects.select_for_update().in_bulk(reservation_ids)
+    book_ids = {r.Book_id for r in reservations.values()}
+    reserved_copies = {}
+    for copy in BookCopy.objects.select_for_update().filter(
+        Book_id__in=book_ids, Status='Reserved'
+    ).order_by('CopyID'):
+        reserved_copies.setdefault(copy.Book_id, []).append(copy)
+    
+    rentals = []
+    for reservation_id in reservation_ids:
+        reservation = reservations.get(reservation_id)
+        if reservation is None:
+            message = 'Reservation not found.'
+        elif reservation.Status != 'Active':
+            message = 'This reservation is not active.'
+        elif reservation.Phase != 'Reserved':
+            message = 'This book has already been issued.'
+        elif not reserved_copies.get(reservation.Book_id):
+            message = 'No reserved copy available for this book.'
+        else:
+            copy = reserved_copies[reservation.Book_id].pop(0)
+            rentals.append(Rental(
+                Copy=copy,
+                User_id=reservation.User_id,
+                ProcessedByUser=admin,
+                DueDate=due_date,
+                Reservation=reservation
+            ))
+            results.append({'id': reservation_id, 'ok': True, 'message': 'Issued.', 'copy_id': copy.CopyID})
+            continue
+        results.append({'id': reservation_id, 'ok': False, 'message': message})
+    
+    if rentals:
+        issued_ids = [rental.Reservation_id for rental in rentals]
+        created = Rental.objects.bulk_create(rentals)
+        for result, rental in zip((r for r in results if r['ok']), created):
+            result['rental_id'] = rental.RentalID
+        BookCopy.objects.filter(CopyID__in=[rental.Copy_id for rental in rentals]).update(Status='Rented')
+        Reservation.objects.filter(ReservationID__in=issued_ids).update(Phase='Rented')
+        OverdueItem.objects.filter(Type='reservation', Reservation_id__in=issued_ids).delete()
+        
+        per_book = Counter(rental.Copy.Book_id for rental in rentals)
+        shift_copy_counts_many(per_book, 'Reserved', 'Rented')
+        invalidate_book_cards(*per_book)
+    
+    return _bulk_response(results)
+
+
+@require_POST
+@admin_required
+@retry_on_lock
+@transaction.atomic
+def bulk_process_returns(request):
+    """
+    Circulation desk: process many returns in one transaction.
+    Takes rental_ids, or copy_ids as read from the barcode scanner, reports the outcome per item.
+    """
+    admin = request.account
+    data = _bulk_payload(request)
+    rental_ids, invalid = _posted_ids(data, 'rental_ids')
+    copy_ids, invalid_copies = _posted_ids(data, 'copy_ids')
+    results = [{'id': value, 'ok': False, 'message': 'Invalid ID.'} for value in invalid + invalid_copies]
+    
+    rentals = Rental.objects.select_for_update().select_related('Copy')
+    # Scanned copies map to their open rental
+    open_rentals = {
+        rental.Copy_id: rental
+        for rental in rentals.filter(Copy_id__in=copy_ids, return__isnull=True)
+    }
+    by_id = rentals.in_bulk(rental_ids)
+    returned = set(
+        Return.objects.filter(Rental_id__in=rental_ids).values_list('Rental_id', flat=True)
+    )
+    
+    to_return = {}
+    for rental_id in rental_ids:
+        rental = by_id.get(rental_id)
+        if rental is None:
+            results.append({'id': rental_id, 'ok': False, 'message': 'Rental not found.'})
+        elif rental_id in returned:
+            results.append({'id': rental_id, 'ok': False, 'message': 'This rental has already been returned.'})
+        else:
+            to_return[rental_id] = rental
+            results.append({'id': rental_id, 'ok': True, 'message': 'Returned.'})
+    for copy_id in copy_ids:
+        rental = open_rentals.get(copy_id)
+        if rental is None:
+            results.append({'copy_id': copy_id, 'ok': False, 'message': 'No open rental for this copy.'})
+        elif rental.RentalID in to_return:
+            results.append({'copy_id': copy_id, 'ok': False, 'message': 'This rental has already been returned.'})
+        else:
+            to_return[rental.RentalID] = rental
+            results.append({'copy_id': copy_id, 'id': rental.RentalID, 'ok': True, 'message': 'Returned.'})
+    to_return = list(to_return.values())
+    
+    if to_return:
+        Return.objects.bulk_create([Return(Rental=rental, ProcessedByUser=admin) for rental in to_return])
+        BookCopy.objects.filter(CopyID__in=[rental.Copy_id for rental in to_return]).update(Status='Available')
+        # Completing the reservation lets the user reserve the book again
+        Reservation.objects.filter(
+            ReservationID__in=[rental.Reservation_id for rental in to_return if rental.Reservation_id]
+        ).update(Status='Completed', Phase='Returned')
+        OverdueItem.objects.filter(Rental_id__in=[rental.RentalID for rental in to_return]).delete()
+        
+        # Copies come back from whatever status they had (normally Rented)
+        moves = {}
+        for rental in to_return:
+            per_book = moves.setdefault(rental.Copy.Status, Counter())
+            per_book[rental.Copy.Book_id] += 1
+        for old_status, per_book in moves.items():
+            shift_copy_counts_many(per_book, old_status, 'Available')
+        invalidate_book_cards(*{rental.Copy.Book_id for rental in to_return})
+    
+    return _bulk_response(results)
+
+
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def delete_reservation(request, reservation_id):
     """Admin action to delete a reservation (only if in Reserved phase)"""
     reservation = get_object_or_404(Reservation.objects.select_related('Book', 'User'), ReservationID=reservation_id)
     
-    # Check if there's a rental for this reservation - use exists() for better performance
-    rental_exists = Rental.objects.filter(
-        User=reservation.User,
-        Copy__Book=reservation.Book
-    ).exclude(
-        return__isnull=False
-    ).exists()
-    
-    if rental_exists:
+    # Check if the book is out on this reservation
+    if reservation.Phase == 'Rented':
         messages.error(request, 'Cannot delete reservation: book has been issued. Process the return first.')
         return redirect('reservations')
     
     # Free up the reserved copy - use select_for_update to prevent race conditions
-    reserved_copy = BookCopy.objects.select_for_update().filter(
-        Book=reservation.Book,
-        Status='Reserved'
-    ).first()
-    
-    if reserved_copy:
-        reserved_copy.Status = 'Available'
-        reserved_copy.save()
+    if reservation.Phase == 'Reserved':
+        reserved_copy = BookCopy.objects.select_for_update().filter(
+            Book=reservation.Book,
+            Status='Reserved'
+        ).first()
+        
+        if reserved_copy:
+            reserved_copy.Status = 'Available'
+            reserved_copy.save()
+            shift_copy_counts(reserved_copy.Book_id, 'Reserved', 'Available')
+            invalidate_book_cards(reserved_copy.Book_id)
     
     book_title = reservation.Book.Title
     reservation.delete()
@@ -887,6 +1147,7 @@ def delete_reservation(request, reservation_id):
 
 
 @admin_required
+@retry_on_lock
 @transaction.atomic
 def update_reservation_dates(request, reservation_id):
     """Admin action to update reservation or rental dates"""
@@ -904,6 +1165,9 @@ def update_reservation_dates(request, reservation_id):
                     
                     reservation.ExpiryTime = expiry_date
                     reservation.save()
+                    # A date that has passed already keeps the reservation overdue
+                    if expiry_date > timezone.now():
+                        clear_overdue_items(reservation_id=reservation.ReservationID)
                     messages.success(request, 'Reservation expiry date updated.')
                 except ValueError:
                     messages.error(request, 'Invalid date format.')
@@ -911,10 +1175,7 @@ def update_reservation_dates(request, reservation_id):
                     messages.error(request, f'Error updating expiry date: {str(e)}')
         
         elif action == 'update_due_date':
-            rental = Rental.objects.filter(
-                User=reservation.User,
-                Copy__Book=reservation.Book
-            ).first()
+            rental = reservation.rental_set.first()
             
             if rental:
                 new_due_date = request.POST.get('due_date')
@@ -925,6 +1186,8 @@ def update_reservation_dates(request, reservation_id):
                         
                         rental.DueDate = due_date
                         rental.save()
+                        if due_date > timezone.now():
+                            clear_overdue_items(rental_id=rental.RentalID)
                         messages.success(request, 'Rental due date updated.')
                     except ValueError:
                         messages.error(request, 'Invalid date format.')
@@ -934,153 +1197,89 @@ def update_reservation_dates(request, reservation_id):
     return redirect('reservations')
 
 
+def _group_overdue_items(items, key, counts):
+    """Attach overdue items to their Book/User group, largest group first"""
+    groups = {}
+    for item in items:
+        obj = getattr(item, key)
+        group = groups.get(obj.pk)
+        if group is None:
+            group = groups[obj.pk] = {key.lower(): obj, 'items': [], 'count': counts[obj.pk]}
+        group['items'].append(item)
+    return sorted(groups.values(), key=lambda g: g['count'], reverse=True)
+
+
 @admin_required
-def overdue(request):
+async def overdue(request):
     """Display overdue reservations and rentals, with tabs for by-book and by-user views"""
-    from Account.models import Account
+    overdue_items, book_counts, user_counts = await gather_queries(
+        # Kept current by the refresh_overdue command and the views that resolve items
+        lambda: list(OverdueItem.objects.select_related(
+            'User', 'Book', 'Book__Author', 'Book__Genre', 'Copy'
+        ).order_by('OverdueSince')),
+        # Tab sizes and ordering come from GROUP BY counts in the database
+        lambda: dict(OverdueItem.objects.order_by().values_list('Book_id').annotate(n=Count('pk'))),
+        lambda: dict(OverdueItem.objects.order_by().values_list('User_id').annotate(n=Count('pk'))),
+    )
 
-    now = timezone.now()
+    context = {
+        'by_book': _group_overdue_items(overdue_items, 'Book', book_counts),
+        'by_user': _group_overdue_items(overdue_items, 'User', user_counts),
+        'total_overdue': len(overdue_items),
+    }
 
-    overdue_items = []
+    return await sync_to_async(render)(request, 'overdue.html', context)
 
-    # 1. Expired reservations (Active, past expiry, never progressed to a rental)
-    expired_reservations = Reservation.objects.filter(
-        Status='Active',
-        ExpiryTime__lt=now
-    ).select_related('User', 'Book', 'Book__Author', 'Book__Genre')
-    
-    # Get list of expired reservations
-    expired_list = list(expired_reservations)
-    
-    # Collect user and book IDs
-    exp_user_ids = set(r.User_id for r in expired_list)
-    exp_book_ids = set(r.Book_id for r in expired_list)
-    
-    # Fetch all rentals for these users/books in one query
-    if exp_user_ids and exp_book_ids:
-        exp_rentals = Rental.objects.filter(
-            User_id__in=exp_user_ids,
-            Copy__Book_id__in=exp_book_ids
-        ).values_list('User_id', 'Copy__Book_id', 'RentTime')
-        
-        # Build a set of (user_id, book_id) that have rentals
-        has_rental_set = set((u, b) for u, b, rt in exp_rentals)
-    else:
-        has_rental_set = set()
-    
-    for reservation in expired_list:
-        key = (reservation.User_id, reservation.Book_id)
-        # Check if there's any rental for this user/book combination
-        # If it's in our set, skip it
-        if key not in has_rental_set:
-            overdue_items.append({
-                'type': 'reservation',
-                'reservation': reservation,
-                'rental': None,
-                'book': reservation.Book,
-                'user': reservation.User,
-                'overdue_since': reservation.ExpiryTime,
-                'copy': None,
-            })
-
-    # 2. Overdue rentals (past due date, no return record)
-    overdue_rentals = Rental.objects.filter(
-        DueDate__lt=now
-    ).select_related(
-        'User', 'Copy', 'Copy__Book', 'Copy__Book__Author', 'Copy__Book__Genre'
-    ).prefetch_related(
-        Prefetch(
-            'return_set',
-            queryset=Return.objects.all()
-        )
-    )
 
-    # Build a mapping of (user_id, book_id, rent_time) -> most recent reservation
-    rental_users_and_books = [
-        (rental.User.UserID, rental.Copy.Book.BookID, rental.RentTime) 
-        for rental in overdue_rentals
-    ]
-    
-    # Get all potentially related reservations in one query
-    reservation_lookup = {}
-    if rental_users_and_books:
-        user_ids = set(user_id for user_id, _, _ in rental_users_and_books)
-        book_ids = set(book_id for _, book_id, _ in rental_users_and_books)
-        
-        all_reservations = Reservation.objects.filter(
-            User_id__in=user_ids,
-            Book_id__in=book_ids
-        ).select_related('User', 'Book', 'Book__Author', 'Book__Genre')
-        
-        # Build lookup: (user_id, book_id, rent_time) -> reservation
-        for user_id, book_id, rent_time in rental_users_and_books:
-            # Find the most recent reservation before this rental
-            matching = [
-                res for res in all_reservations 
-                if res.User_id == user_id 
-                and res.Book_id == book_id 
-                and res.ReservationTime <= rent_time
-            ]
-            if matching:
-                # Get the most recent one
-                reservation_lookup[(user_id, book_id, rent_time)] = max(
-                    matching, 
-                    key=lambda r: r.ReservationTime
-                )
+async def _async_blocks(blocks):
+    """
+    Hand a sync export generator to an ASGI server block by block. Each
+    block is pulled on the sync thread, where the generator's queries and
+    its database cursor live, so the rows are still streamed rather than
+    collected into a list first.
+    """
+    next_block = sync_to_async(next)
+    done = object()
+    try:
+        while (block := await next_block(blocks, done)) is not done:
+            yield block
+    finally:
+        # Closes the open cursor if the client went away half way
+        await sync_to_async(blocks.close)()
 
-    for rental in overdue_rentals:
-        # Check if there's a return (already prefetched - no query!)
-        return_records = list(rental.return_set.all())
-        has_return = len(return_records) > 0
-        
-        if not has_return:
-            # Get the associated reservation from our lookup (no query!)
-            reservation = reservation_lookup.get(
-                (rental.User.UserID, rental.Copy.Book.BookID, rental.RentTime)
-            )
 
-            overdue_items.append({
-                'type': 'rental',
-                'reservation': reservation,
-                'rental': rental,
-                'book': rental.Copy.Book,
-                'user': rental.User,
-                'overdue_since': rental.DueDate,
-                'copy': rental.Copy,
-            })
-
-    # --- By-Book grouping ---
-    by_book_map = {}
-    for item in overdue_items:
-        book_id = item['book'].BookID
-        if book_id not in by_book_map:
-            by_book_map[book_id] = {
-                'book': item['book'],
-                'items': [],
-            }
-        by_book_map[book_id]['items'].append(item)
-
-    by_book = list(by_book_map.values())
-    by_book.sort(key=lambda g: len(g['items']), reverse=True)
-
-    # --- By-User grouping ---
-    by_user_map = {}
-    for item in overdue_items:
-        uid = item['user'].UserID
-        if uid not in by_user_map:
-            by_user_map[uid] = {
-                'user': item['user'],
-                'items': [],
-            }
-        by_user_map[uid]['items'].append(item)
-
-    by_user = list(by_user_map.values())
-    by_user.sort(key=lambda g: len(g['items']), reverse=True)
+def _export_response(request, name, columns, rows):
+    """Stream an export as a CSV (default) or JSON Lines download"""
+    fmt = request.GET.get('format')
+    if fmt not in exports.FORMATS:
+        fmt = 'csv'
+    extension, content_type = exports.FORMATS[fmt]
+    blocks = exports.export_lines(columns, rows, fmt)
+    if isinstance(request, ASGIRequest):
+        # An ASGI server would otherwise read a sync iterator to the end before sending it
+        blocks = _async_blocks(blocks)
+    response = StreamingHttpResponse(blocks, content_type=content_type)
+    filename = f'{name}-{timezone.localdate():%Y%m%d}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-    context = {
-        'by_book': by_book,
-        'by_user': by_user,
-        'total_overdue': len(overdue_items),
-    }
 
-    return render(request, 'overdue.html', context)
\ No newline at end of file
+@admin_required
+def export_catalog(request):
+    """Download every book with its copy counters"""
+    return _export_response(request, 'catalog', exports.CATALOG_COLUMNS, exports.catalog_rows())
+
+
+@login_required
+def export_reservations(request):
+    """Download the reservations the reservations page shows for the current filters"""
+    reservations, _ = _filtered_reservations(request, user_is_admin(request))
+    return _export_response(
+        request, 'reservations', exports.RESERVATION_COLUMNS, exports.reservation_rows(reservations)
+    )
+
+
+@admin_required
+def export_overdue(request):
+    """Download the overdue report"""
+    return _export_response(request, 'overdue', exports.OVERDUE_COLUMNS, exports.overdue_rows())
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,13 +77,75 @@ WSGI_APPLICATION = 'Library.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite set up for several workers writing at once. The database file is
+# switched to journal_mode=WAL once, after migrate (Books.models.use_wal_journal),
+# so readers don't block the writer and vice versa. Every new connection runs
+# the PRAGMAs below, none of which are stored in the file:
+#   synchronous=NORMAL    in WAL mode only checkpoints fsync; still crash-safe
+#   busy_timeout          wait up to 5 s for the write lock instead of failing
+#   cache_size/mmap_size  20 MB page cache, 128 MB memory-mapped reads
+# transaction_mode IMMEDIATE takes the write lock when an atomic block starts.
+# select_for_update() is a no-op on SQLite, so this is what serialises the
+# write views, and a transaction can no longer fail halfway through when it
+# goes from reading to writing. Lock errors that still get through are
+# retried by Books.locking.retry_on_lock.
+# Request threads keep their connection for CONN_MAX_AGE seconds and check it
+# before reuse. The worker threads of the async views (Books/async_queries.py)
+# close theirs after every query, since no request cleanup runs there.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA synchronous = NORMAL;'
+                'PRAGMA busy_timeout = 5000;'
+                'PRAGMA cache_size = -20000;'
+                'PRAGMA mmap_size = 134217728;'
+                'PRAGMA temp_store = MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Write views retry a transaction that hit "database is locked" this many
+# times, backing off from this many seconds (doubling, with jitter)
+DATABASE_LOCK_RETRIES = 3
+DATABASE_LOCK_BACKOFF = 0.05
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# In-process memory by default. To share cached book cards between worker
+# processes without an external service, switch to
+# 'django.core.cache.backends.filebased.FileBasedCache' with a directory LOCATION.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'library',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
+# Sessions
+# The session (user_id and display name) lives in a signed cookie, so reading
+# it costs no query and every worker process sees the same data; a
+# per-process cache in front of the database would keep serving a session
+# that another worker had flushed. The middleware only re-sends a session
+# that was modified, and one-shot notices go through the messages framework
+# in a cookie as well.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -102,6 +165,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs on a small pool (Account/hashing.py) so a burst of
+# logins can't tie up every worker: this many hashes at once, this many
+# waiting, and callers give up after the timeout (seconds).
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 32
+PASSWORD_HASHING_TIMEOUT = 10
+
+# Login and admin code attempts allowed per client IP / per account, as
+# token buckets in this cache (Account/throttling.py)
+THROTTLE_CACHE = 'default'
+THROTTLE_RATES = {
+    'login-ip': '30/min',
+    'login-account': '5/min',
+    'admin-access-ip': '10/min',
+    'admin-access-account': '5/min',
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -128,4 +208,7 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Django Compressor settings
 COMPRESSOR_ENABLED = True
-COMPRESSOR_OUTPUT_DIR = 'compressed'
\ No newline at end of file
+COMPRESSOR_OUTPUT_DIR = 'compressed'
+
+# Seconds a rendered book card stays cached on the home page (see Books/catalog_cache.py)
+BOOK_CARD_CACHE_TIMEOUT = 60 * 60 * 24